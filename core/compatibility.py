@@ -105,14 +105,20 @@ PYTHON_VERSION = PythonVersion()
 
 if PYTHON_VERSION < 3:
     import cPickle as pickle
+    from collections import Mapping
     from cStringIO import StringIO
+    from Queue import Queue, Empty
+    from time import time as monotonic
     BytesIO = StringIO
     input = raw_input
     range = xrange
     unicode = unicode
 else:
     import pickle
+    from collections.abc import Mapping
     from io import StringIO, BytesIO
+    from queue import Queue, Empty
+    from time import monotonic
     input = input
     range = range
     unicode = str
\ No newline at end of file
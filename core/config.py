@@ -10,7 +10,7 @@ from locale import getdefaultlocale
 
 from core.base import format_file_path
 from core.compatibility import get_items
-from core.constants import CONFIG_PATH, DEFAULT_PATH, DEFAULT_LANGUAGE, MAX_INT, APP_LIST_FILE
+from core.constants import CONFIG_PATH, DEFAULT_PATH, DEFAULT_LANGUAGE, MAX_INT, APP_LIST_FILE, UPDATES_PER_SECOND
 from core.os import get_resolution, create_folder, OS_DEBUG
 
 
@@ -268,6 +268,18 @@ _config_defaults = {
         'CheckRunningApplications': (60, int, 0, 'How many ticks to wait between checking if something is running.'),
         'ReloadApplicationList': (18000, int, 0, 'How many ticks to wait before reloading {}.'.format(APP_LIST_FILE)),
         'ShowQueuedCommands': (1200, int, 'How many ticks to wait before showing the number of commands waiting to be processed.'),
+        'ShowFrameStats': (3600, int, 0, 'How many ticks to wait before showing how long each update has been taking.'
+                                         ' Set to 0 to disable.'),
+        'ProfileStages': (0, int, 0, 'How many ticks to wait between writing how long each part of the tracking takes'
+                                     ' to profile.jsonl. Set to 0 to disable.'),
+        'IdleTimeout': (3600, int, 0, 'How many ticks without any input before lowering the update rate.'
+                                      ' Set to 0 to disable.'),
+        'IdleUpdatesPerSecond': (4, int, 1, UPDATES_PER_SECOND, 'How many times per second to check for input when idle.'),
+        'QueueBatchSize': (10, int, 1, 'How many ticks of data to group together before sending to the background process.'
+                                       ' Set to 1 to send every tick separately.'),
+        'QueueBatchTime': (250, int, 0, 'Maximum number of milliseconds to hold data before sending it to the background process.'),
+        'SharedMemoryTransport': (False, bool, 'Send mouse and keyboard events to the background process through shared memory'
+                                               ' instead of a queue. Requires Python 3.8 or higher.'),
         'RepeatKeyPress': (0, int, 0, 'How many ticks to wait before recording a new key press'
                                           ' if a key is being held down (set to 0 to disable).'),
         'RepeatClicks': (14, int, 0, 'How many ticks to wait before recording a click'
@@ -287,6 +299,9 @@ _config_defaults = {
         'KeyboardFontWidthOffset': (5.0, float),
         'KeyboardFontSpacing': (5.0, float),
         'HistoryCheck': (1200, int, 0, 'How many ticks to wait before checking the history length and trimming if needed.'),
+        'ProfileCacheSize': (2, int, 0, 'How many recently used profiles to keep loaded, so switching back to them is instant.'
+                                       ' Set to 0 to disable.'),
+        'ProfileCacheMemory': (1024, int, 0, 'Maximum number of megabytes to use for the recently used profiles.'),
         'RunAsAdministrator': (True, bool, 'This fixes some issues with keyboard tracking.'),
         'RefreshGamepads': (600, int, 1, 'How many ticks to wait before refreshing the list of connected gamepads.')
     }
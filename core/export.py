@@ -23,16 +23,16 @@ class ExportCSV(object):
         
         if numpy.count(data) < CONFIG['GenerateCSV']['MinimumPoints']:
             return None
-        output = numpy.set_type(data, str)
+        output = numpy.set_type(numpy.densify(data), str)
         return '\n'.join(','.join(row) for row in output)
    
     def tracks(self, image_name):
         
         _print('Generating CSV from tracks...')
-        for resolution in self.data['Maps']['Tracks']:
+        for resolution, maps in get_items(self.data['Resolution']):
             CONFIG['GenerateImages']['_TempResolutionX'], CONFIG['GenerateImages']['_TempResolutionY'] = resolution
             
-            result = self._generate(resolution, self.data['Maps']['Tracks'][resolution])
+            result = self._generate(resolution, maps['Tracks'])
             if result is not None:
                 file_name = image_name.generate('csv-tracks', reload=True)
                 create_folder(file_name)
@@ -45,15 +45,19 @@ class ExportCSV(object):
         
         _print('Generating CSV from clicks...')
         
-        for i, mouse_button in enumerate(self.data['Maps']['Click']['Single']):
+        for i, mouse_button in enumerate(('Left', 'Middle', 'Right')):
             CONFIG['GenerateHeatmap']['_MouseButtonLeft'] = i == 0
             CONFIG['GenerateHeatmap']['_MouseButtonMiddle'] = i == 1
             CONFIG['GenerateHeatmap']['_MouseButtonRight'] = i == 2
             
-            for resolution, array in get_items(self.data['Maps']['Click']['Single'][mouse_button]):
+            for resolution, maps in get_items(self.data['Resolution']):
                 CONFIG['GenerateImages']['_TempResolutionX'], CONFIG['GenerateImages']['_TempResolutionY'] = resolution
-            
-                result = self._generate(resolution, array)
+                
+                #Skip any click maps that were never created
+                clicks = maps['Clicks']['All']['Single']
+                if mouse_button not in clicks:
+                    continue
+                result = self._generate(resolution, clicks[mouse_button])
                 if result is not None:
                     file_name = image_name.generate('csv-clicks', reload=True)
                     create_folder(file_name)
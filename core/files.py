@@ -5,6 +5,7 @@ Source: https://github.com/Peter92/MouseTracks
 
 from __future__ import absolute_import
 
+import copy
 import time
 import zlib
 import os
@@ -17,6 +18,7 @@ from core.base import format_file_path, format_name
 from core.config import CONFIG
 from core.compatibility import PYTHON_VERSION, get_items, BytesIO, unicode, pickle
 from core.constants import DEFAULT_NAME, MAX_INT
+from core.history import HistoryBuffer
 from core.os import remove_file, rename_file, create_folder, hide_file, get_modified_time, list_directory, file_exists
 from core.versions import VERSION, upgrade_version, IterateMaps
 
@@ -68,29 +70,93 @@ def _get_paths(program_name):
             'BackupFolder': backup_folder, 'TempFolder': temp_folder, 'CorruptedFolder': corrupted_folder}
 
 
-def prepare_file(data, legacy=False):
-    """Prepare data for saving."""
+def snapshot_data(data):
+    """Copy the data so it can be saved while the original is still being used.
+    Anything with a snapshot method (such as the maps) is copied with that,
+    so any arrays only get copied if they are written to.
+    """
+    snapshot = getattr(data, 'snapshot', None)
+    if snapshot is not None:
+        return snapshot()
+    if isinstance(data, dict):
+        return {key: snapshot_data(value) for key, value in get_items(data)}
+    if isinstance(data, list):
+        return [snapshot_data(value) for value in data]
+    return copy.deepcopy(data)
+
+
+def _compress_member(members, path, value, save):
+    """Save and compress an array for the zip file.
+    If it's the same generation as the last save, the previous result is used.
+    """
+    generation = getattr(value, 'generation', None)
+    if generation is not None:
+        try:
+            saved_generation, compressed = members[path]
+        except KeyError:
+            pass
+        else:
+            if saved_generation == generation:
+                return compressed
+    compressed = zlib.compress(save(value))
+    members[path] = (generation, compressed)
+    return compressed
+
+
+def _history_save(history):
+    return numpy.save(history.to_arrays())
+
+
+def prepare_file(data, legacy=False, members=None):
+    """Prepare data for saving.
+    
+    The arrays are compressed before being added to the zip file.
+    To only compress the ones that have changed, pass in the same
+    members dict each time a profile is saved.
+    """
     data['Time']['Modified'] = time.time()
     data['Version'] = VERSION
     
     if legacy:
         return zlib.compress(pickle.dumps(data, PICKLE_PROTOCOL))
     
+    if members is None:
+        members = {}
+    
     #Separate the maps from the main dictionary
-    numpy_maps = IterateMaps(data['Resolution']).separate()
+    iterate = IterateMaps(data['Resolution'])
+    numpy_maps = iterate.separate()
+    
+    #Separate the track history, leaving only the resolutions to be pickled
+    history = data['HistoryAnimation']['Tracks']
+    data['HistoryAnimation']['Tracks'] = history.resolutions()
     
     #Write the maps to a zip file in memory
     io = BytesIO()
     with CustomOpen(io, 'w') as f:
         f.write(pickle.dumps(data, PICKLE_PROTOCOL), '_')
         f.write(str(len(numpy_maps)), 'n')
-        for i, m in enumerate(numpy_maps):
-            f.write(numpy.save(m), i)
+        for i, (path, m) in enumerate(zip(iterate.paths, numpy_maps)):
+            f.write(_compress_member(members, path, m, numpy.save), 'z{}'.format(i), compress=False)
+        f.write(_compress_member(members, 'History', history, _history_save), 'zh', compress=False)
+    
+    #Forget anything that no longer exists
+    for path in set(members) - set(iterate.paths) - {'History'}:
+        del members[path]
     
     #Undo the modify
     IterateMaps(data['Resolution']).join(numpy_maps)
+    data['HistoryAnimation']['Tracks'] = history
     
     return io.getvalue()
+
+
+def _read_member(f, name):
+    """Read an array from the zip file, which may have been compressed before being added."""
+    try:
+        return zlib.decompress(f.read('z{}'.format(name)))
+    except KeyError:
+        return f.read(name)
     
 
 def decode_file(f, legacy=False):
@@ -99,11 +165,19 @@ def decode_file(f, legacy=False):
         return pickle.loads(zlib.decompress(f.read()))
         
     data = pickle.loads(f.read('_'))
-    numpy_maps = [numpy.load(f.read(i)) for i in range(int(f.read('n')))]
+    numpy_maps = [numpy.load(_read_member(f, i)) for i in range(int(f.read('n')))]
     try:
         IterateMaps(data['Maps']).join(numpy_maps, _legacy=True)
     except KeyError:
         IterateMaps(data['Resolution']).join(numpy_maps, _legacy=False)
+    
+    #Older versions kept the track history in the pickled data
+    try:
+        history = numpy.load_arrays(_read_member(f, 'h'))
+    except KeyError:
+        pass
+    else:
+        data['HistoryAnimation']['Tracks'] = HistoryBuffer.from_arrays(history, data['HistoryAnimation']['Tracks'])
     return data
 
     
@@ -165,6 +239,15 @@ class LoadData(dict):
         self.version = self['Version']
         self.name = profile_name
     
+    def memory_usage(self):
+        """Estimate how many bytes are used by the maps and history."""
+        total = self['HistoryAnimation']['Tracks'].nbytes
+        for maps in self['Resolution'].values():
+            total += maps['Tracks'].nbytes
+            for buttons in maps['Clicks']['All'].values():
+                total += sum(array.nbytes for array in buttons.values())
+        return int(total)
+    
     def get_tracks(self, session=False):
         """Return dictionary of tracks along with top resolution and range of values."""
         start_time = self['Ticks']['Session']['Tracks'] if session else 0
@@ -175,7 +258,12 @@ class LoadData(dict):
         max_value = -float('inf')
         result = {}
         for resolution, maps in get_items(self['Resolution']):
-            array = numpy.max(maps['Tracks'] - start_time, 0)
+        
+            #Only convert tiled arrays if they contain anything
+            #The maps are stored as unsigned, so convert before subtracting
+            if not numpy.count(maps['Tracks']):
+                continue
+            array = numpy.max(numpy.densify(maps['Tracks'], dtype='int64') - start_time, 0)
             num_records = numpy.count(array)
             if num_records:
                 result[resolution] = array
@@ -195,7 +283,6 @@ class LoadData(dict):
         return top_resolution, (int(min_value), int(max_value)), result
     
     def get_clicks(self, double_click=False, session=False):
-        session = 'Session' if session else 'All'
         click_type = 'Double' if double_click else 'Single'
         
         top_resolution = None
@@ -204,9 +291,11 @@ class LoadData(dict):
         max_value = -float('inf')
         result = {}
         for resolution, maps in get_items(self['Resolution']):
-            click_maps = (maps['Clicks'][session][click_type]['Left'],
-                          maps['Clicks'][session][click_type]['Middle'],
-                          maps['Clicks'][session][click_type]['Right'])
+            click_maps = (maps['Clicks']['All'][click_type]['Left'],
+                          maps['Clicks']['All'][click_type]['Middle'],
+                          maps['Clicks']['All'][click_type]['Right'])
+            if session:
+                click_maps = tuple(array.session() for array in click_maps)
             
             #Get information on array
             contains_data = False
@@ -224,8 +313,9 @@ class LoadData(dict):
                 min_value = min(min_value, numpy.min(array))
                 max_value = max(max_value, numpy.max(array))
                 
+            #Only convert the sparse arrays if they contain anything
             if contains_data:
-                result[resolution] = click_maps
+                result[resolution] = tuple(numpy.densify(array, dtype='int64') for array in click_maps)
         
         if not result:
             return None
@@ -337,15 +427,19 @@ class CustomOpen(object):
             return self._file_object.read()
         return self.zip.read(str(filename))
 
-    def write(self, data, filename=None):
-        """Write to the file."""
+    def write(self, data, filename=None, compress=True):
+        """Write to the file.
+        Set compress to False for anything that is already compressed.
+        """
         if self.zip is None:
             if isinstance(data, (str, unicode)):
                 return self._file_object.write(data.encode('utf-8'))
             return self._file_object.write(data)
         if filename is None:
             raise TypeError('filename required when writing to zip')
-        return self.zip.writestr(str(filename), data)
+        if compress:
+            return self.zip.writestr(str(filename), data)
+        return self.zip.writestr(str(filename), data, zipfile.ZIP_STORED)
  
     def seek(self, amount):
         """Seek to a certain point of the file."""
@@ -0,0 +1,192 @@
+"""
+This is part of the Mouse Tracks Python application.
+Source: https://github.com/Peter92/MouseTracks
+"""
+#Store the recent mouse history in a ring buffer
+
+from __future__ import absolute_import
+
+from collections import deque
+
+import core.numpy as numpy
+
+
+class HistoryBuffer(object):
+    """Ring buffer of mouse coordinates, with markers of where the resolution changed.
+
+    Points are given an absolute position when added, and each marker
+    records the position where its resolution starts. Trimming only moves
+    the start of the ring, so it doesn't depend on how many points there are.
+
+    Iterating through it gives the old list layout of segments, where each
+    segment is [resolution, (x, y), (x, y), ...].
+    
+    As with the maps, the generation changes whenever it is modified.
+    """
+    def __init__(self, capacity=1024, dtype='int32'):
+        self._points = numpy.array((2, capacity), create=True, dtype=dtype)
+        self._start = 0
+        self._length = 0
+        self._position = 0
+        self._markers = deque()
+        self.generation = numpy.new_generation()
+
+    def __len__(self):
+        """Get the number of points stored."""
+        return self._length
+
+    def __repr__(self):
+        return '{}(points={}, segments={})'.format(type(self).__name__, self._length, len(self._markers))
+
+    @property
+    def capacity(self):
+        return len(self._points)
+
+    @property
+    def nbytes(self):
+        return self._points.nbytes
+
+    def _resize(self, capacity):
+        points = numpy.array((2, capacity), create=True, dtype=self._points.dtype.name)
+        points[:self._length] = self.points()
+        self._points = points
+        self._start = 0
+
+    def set_resolution(self, resolution):
+        """Start a new segment if the resolution has changed."""
+        if self._markers:
+            position, last_resolution = self._markers[-1]
+            if last_resolution == resolution:
+                return
+
+            #Replace the last marker if nothing was recorded with it
+            if position == self._position:
+                self._markers.pop()
+        self._markers.append((self._position, resolution))
+        self.generation = numpy.new_generation()
+
+    def append(self, point):
+        """Add a single point."""
+        if self._length == len(self._points):
+            self._resize(len(self._points) * 2)
+        self._points[(self._start + self._length) % len(self._points)] = point
+        self._length += 1
+        self._position += 1
+        self.generation = numpy.new_generation()
+
+    def extend(self, points):
+        """Add an array of points."""
+        points = numpy.array(points, dtype=self._points.dtype.name).reshape(-1, 2)
+        required = self._length + len(points)
+        if required > len(self._points):
+            capacity = len(self._points)
+            while capacity < required:
+                capacity *= 2
+            self._resize(capacity)
+
+        #Write in up to two parts, in case it wraps around the end
+        capacity = len(self._points)
+        end = (self._start + self._length) % capacity
+        first = len(points) if end + len(points) <= capacity else capacity - end
+        self._points[end:end + first] = points[:first]
+        self._points[:len(points) - first] = points[first:]
+        self._length += len(points)
+        self._position += len(points)
+        self.generation = numpy.new_generation()
+
+    def trim(self, max_length):
+        """Remove the oldest points until there are no more than max_length left."""
+        if self._length <= max_length:
+            return
+        self._start = (self._start + self._length - max_length) % len(self._points)
+        self._length = max_length
+        self.generation = numpy.new_generation()
+
+        #Remove any markers that are no longer needed
+        first = self._position - self._length
+        while len(self._markers) > 1 and self._markers[1][0] <= first:
+            self._markers.popleft()
+
+    def points(self):
+        """Get all points in order as a single array."""
+        end = self._start + self._length
+        if end <= len(self._points):
+            return self._points[self._start:end]
+        return numpy.concatenate((self._points[self._start:], self._points[:end - len(self._points)]))
+
+    def segments(self):
+        """Iterate through each resolution and an array of its points."""
+        points = self.points()
+        first = self._position - self._length
+        markers = list(self._markers)
+        for i, (position, resolution) in enumerate(markers):
+            try:
+                end = markers[i + 1][0]
+            except IndexError:
+                end = self._position
+            yield resolution, points[max(position - first, 0):end - first]
+
+    def __iter__(self):
+        for resolution, points in self.segments():
+            yield [resolution] + [tuple(point) for point in points.tolist()]
+
+    def _load(self, points, position, markers):
+        """Use an existing array of points in order, without copying it."""
+        self._points = points if len(points) else numpy.array((2, 1024), create=True, dtype=points.dtype.name)
+        self._start = 0
+        self._length = len(points)
+        self._position = position
+        self._markers = deque(markers)
+        self.generation = numpy.new_generation()
+
+    def __getstate__(self):
+        """Only save the points being used."""
+        return {'points': self.points().copy(),
+                'position': self._position,
+                'markers': list(self._markers)}
+
+    def __setstate__(self, state):
+        self._load(state['points'], state['position'], state['markers'])
+
+    def snapshot(self):
+        """Copy the points being used, such as to save them in another thread."""
+        new = HistoryBuffer.__new__(HistoryBuffer)
+        new._load(self.points().copy(), self._position, self._markers)
+        new.generation = self.generation
+        return new
+
+    def resolutions(self):
+        """Get the resolution of each segment."""
+        return [resolution for position, resolution in self._markers]
+
+    def to_arrays(self):
+        """Convert to separate arrays of coordinates and segment offsets.
+        The resolutions are not included, use resolutions() to get them.
+        """
+        points = self.points()
+        first = self._position - self._length
+        return {'x': points[:, 0],
+                'y': points[:, 1],
+                'offsets': numpy.array([max(position - first, 0) for position, resolution in self._markers], dtype='int64'),
+                'position': numpy.array([self._position], dtype='int64')}
+
+    @classmethod
+    def from_arrays(cls, arrays, resolutions):
+        """Load from the output of to_arrays() and resolutions()."""
+        new = cls.__new__(cls)
+        points = numpy.column_stack((arrays['x'], arrays['y']))
+        position = int(arrays['position'][0])
+        first = position - len(points)
+        markers = [(first + int(offset), resolution) for offset, resolution in zip(arrays['offsets'], resolutions)]
+        new._load(points, position, markers)
+        return new
+
+    @classmethod
+    def from_segments(cls, segments):
+        """Convert the old list of segments."""
+        new = cls()
+        for segment in segments:
+            new.set_resolution(segment[0])
+            if len(segment) > 1:
+                new.extend(segment[1:])
+        return new
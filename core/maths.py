@@ -212,4 +212,12 @@ def round_int(n, min_value=None, max_value=None):
         n = max(n, min_value)
     if max_value is not None:
         n = min(n, max_value)
-    return n
\ No newline at end of file
+    return n
+
+
+def iterate_bits(n):
+    """Get the position of each set bit in an integer, starting from the lowest."""
+    while n:
+        lowest = n & -n
+        yield lowest.bit_length() - 1
+        n ^= lowest
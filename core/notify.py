@@ -3,7 +3,9 @@ This is part of the Mouse Tracks Python application.
 Source: https://github.com/Peter92/MouseTracks
 """
 
-from __future__ import absolute_import
+from __future__ import absolute_import, print_function
+
+import time
 
 from core.base import format_file_path
 from core.config import CONFIG
@@ -88,6 +90,10 @@ SAVE_SKIP = 69
 
 SAVE_PREPARE = 70
 
+SAVE_BACKGROUND_SUCCESS = 71
+
+SAVE_BACKGROUND_FAIL = 72
+
 START_MAIN = 80
 
 START_THREAD = 81
@@ -96,10 +102,14 @@ DATA_LOADED = 82
 
 DATA_NOTFOUND = 83
 
+DATA_CACHED = 85
+
 MT_PATH = 84
 
 QUEUE_SIZE = 96
 
+FRAME_STATS = 97
+
 PROCESS_EXIT = 112
 
 THREAD_EXIT = 113
@@ -121,6 +131,68 @@ GAMEPAD_FOUND = 133
 GAMEPAD_LOST = 134
 
 
+#How important each message is, anything below the MessageLevel config option is ignored
+MESSAGE_LEVELS = {
+    MOUSE_UNDETECTED: 2,
+    MOUSE_DETECTED: 2,
+    MOUSE_POSITION: 0,
+    MOUSE_OFFSCREEN: 1,
+    MOUSE_ONSCREEN: 1,
+    MOUSE_CLICKED: 1,
+    MOUSE_UNCLICKED: 0,
+    MOUSE_CLICKED_OFFSCREEN: 1,
+    MOUSE_CLICKED_HELD: 1,
+    MOUSE_CLICKED_DOUBLE: 1,
+    TRACK_COMPRESS_START: 2,
+    TRACK_COMPRESS_END: 2,
+    RESOLUTION_CHANGED: 2,
+    MONITOR_CHANGED: 1,
+    APPLICATION_RESOLUTION: 1,
+    APPLICATION_MOVE: 1,
+    APPLICATION_RESIZE: 1,
+    KEYBOARD_PRESSES: 1,
+    KEYBOARD_PRESSES_HELD: 1,
+    KEYBOARD_RELEASED: 0,
+    APPLICATION_STARTED: 2,
+    APPLICATION_QUIT: 2,
+    APPLICATION_RELOAD: 1,
+    APPLICATION_LISTEN: 1,
+    APPLICATION_LOADING: 2,
+    APPLICATION_FOCUSED: 1,
+    APPLICATION_UNFOCUSED: 1,
+    APPLIST_UPDATE_START: 1,
+    APPLIST_UPDATE_SUCCESS: 1,
+    APPLIST_UPDATE_FAIL: 1,
+    SAVE_START: 2,
+    SAVE_SUCCESS: 2,
+    SAVE_FAIL: 2,
+    SAVE_FAIL_RETRY: 2,
+    SAVE_FAIL_END: 2,
+    SAVE_SKIP: 2,
+    SAVE_PREPARE: 2,
+    SAVE_BACKGROUND_SUCCESS: 1,
+    SAVE_BACKGROUND_FAIL: 2,
+    START_MAIN: 2,
+    START_THREAD: 2,
+    DATA_LOADED: 1,
+    DATA_NOTFOUND: 1,
+    DATA_CACHED: 1,
+    MT_PATH: 2,
+    QUEUE_SIZE: 1,
+    FRAME_STATS: 1,
+    PROCESS_EXIT: 2,
+    THREAD_EXIT: 2,
+    PROCESS_NOT_UNIQUE: 2,
+    GAMEPAD_REFRESH: 0,
+    GAMEPAD_AXIS: 0,
+    GAMEPAD_BUTTON_PRESS: 1,
+    GAMEPAD_BUTTON_HELD: 1,
+    GAMEPAD_BUTTON_RELEASED: 0,
+    GAMEPAD_FOUND: 2,
+    GAMEPAD_LOST: 2
+}
+
+
 def get_plural(word, amount):
     return word['single'] if amount == 1 else word['plural']
 
@@ -133,11 +205,14 @@ def capitalize(sentence):
     
     
 class Notify(object):
-    
+    """Store messages as events, and only convert them to text when they are output.
+    Anything below the message level is ignored as soon as it is received.
+    """
     def __init__(self):
         all_strings = Language().get_strings()
         self.string = all_strings['string']['track']
         self.word = all_strings['word']
+        self.level = CONFIG['Advanced']['MessageLevel']
         
         self.reset()
     
@@ -148,29 +223,35 @@ class Notify(object):
         mb = self.word['mousebutton']
         return (mb['left'], mb['middle'], mb['right'])[id]
     
+    def allowed(self, message_id):
+        """Check if a message will be shown.
+        Use this before building any expensive arguments.
+        """
+        return MESSAGE_LEVELS.get(message_id, 2) >= self.level
+    
     def __call__(self, message_id, *args):
-        
-        q0 = self.message_queue[0].append
-        q1 = self.message_queue[1].append
-        q2 = self.message_queue[2].append
-        
         if message_id == MESSAGE_DEBUG:
             self._debug.append(args)
-            
-        elif message_id == MOUSE_UNDETECTED:
-            q2(self.string['mouse']['undetected'])
+        elif MESSAGE_LEVELS.get(message_id, 2) >= self.level:
+            self.events.append((message_id, args, time.time()))
+        return self
+    
+    def _format(self, message_id, args):
+        """Convert a message to text."""
+        if message_id == MOUSE_UNDETECTED:
+            return self.string['mouse']['undetected']
             
         elif message_id == MOUSE_DETECTED:
-            q2(self.string['mouse']['detected'])
+            return self.string['mouse']['detected']
             
         elif message_id == MOUSE_OFFSCREEN:
-            q1(self.string['mouse']['offscreen'])
+            return self.string['mouse']['offscreen']
             
         elif message_id == MOUSE_ONSCREEN:
-            q1(self.string['mouse']['onscreen'])
+            return self.string['mouse']['onscreen']
             
         elif message_id == MOUSE_POSITION:
-            q0(self.string['mouse']['position'].format(X=args[0][0], Y=args[0][1]))
+            return self.string['mouse']['position'].format(X=args[0][0], Y=args[0][1])
         
         #Mouse clicks
         elif message_id in (MOUSE_CLICKED, MOUSE_CLICKED_DOUBLE, MOUSE_CLICKED_HELD):
@@ -193,37 +274,37 @@ class Notify(object):
             else:
                 screen = 'onscreen'
                 
-            q1(self.string['mouse'][click_group][screen].format(MB=self._mb(mouse_button),
-                                                                X=resolution[0], Y=resolution[1],
-                                                                C=self.word['mouse']['click'][click_type]))
+            return self.string['mouse'][click_group][screen].format(MB=self._mb(mouse_button),
+                                                                    X=resolution[0], Y=resolution[1],
+                                                                    C=self.word['mouse']['click'][click_type])
         
         elif message_id == MOUSE_UNCLICKED:
-            q0(self.string['mouse']['unclicked'])
+            return self.string['mouse']['unclicked']
             
         elif message_id == TRACK_COMPRESS_START:
-            q2(self.string['compress']['start'])
+            return self.string['compress']['start']
             
         elif message_id == TRACK_COMPRESS_END:
-            q2(self.string['compress']['end'])
+            return self.string['compress']['end']
             
         elif message_id == RESOLUTION_CHANGED:
-            q2(self.string['resolution']['new'].format(X1=args[0][0], Y1=args[0][1],
-                                                       X2=args[1][0], Y2=args[1][1]))
+            return self.string['resolution']['new'].format(X1=args[0][0], Y1=args[0][1],
+                                                           X2=args[1][0], Y2=args[1][1])
                                                    
         elif message_id == MONITOR_CHANGED:
-            q1(self.string['resolution']['changed'].format(X1=args[0][0], Y1=args[0][1],
-                                                           X2=args[1][0], Y2=args[1][1]))
+            return self.string['resolution']['changed'].format(X1=args[0][0], Y1=args[0][1],
+                                                               X2=args[1][0], Y2=args[1][1])
                                                        
         elif message_id == APPLICATION_RESOLUTION:
-            q1(self.string['resolution']['application']['start'].format(X=args[0][0], Y=args[0][1]))
+            return self.string['resolution']['application']['start'].format(X=args[0][0], Y=args[0][1])
                                                        
         elif message_id == APPLICATION_MOVE:
-            q1(self.string['resolution']['application']['move'].format(X1=args[0][0], Y1=args[0][1],
-                                                                       X2=args[1][0], Y2=args[1][1]))
+            return self.string['resolution']['application']['move'].format(X1=args[0][0], Y1=args[0][1],
+                                                                           X2=args[1][0], Y2=args[1][1])
                                                        
         elif message_id == APPLICATION_RESIZE:
-            q1(self.string['resolution']['application']['resize'].format(X1=args[0][0], Y1=args[0][1],
-                                                                         X2=args[1][0], Y2=args[1][1]))
+            return self.string['resolution']['application']['resize'].format(X1=args[0][0], Y1=args[0][1],
+                                                                             X2=args[1][0], Y2=args[1][1])
         
         #Key presses
         elif message_id in (KEYBOARD_PRESSES, KEYBOARD_PRESSES_HELD, KEYBOARD_RELEASED):
@@ -234,20 +315,20 @@ class Notify(object):
             release = get_plural(self.word['release'], num_presses)
             
             if message_id == KEYBOARD_PRESSES:
-                q1(self.string['keyboard']['press'].format(K=key, P=press, V=', '.join(keypresses)))
+                return self.string['keyboard']['press'].format(K=key, P=press, V=', '.join(keypresses))
                 
             elif message_id == KEYBOARD_PRESSES_HELD:
-                q1(self.string['keyboard']['held'].format(K=key, P=press, V=', '.join(keypresses)))
+                return self.string['keyboard']['held'].format(K=key, P=press, V=', '.join(keypresses))
                 
             elif message_id == KEYBOARD_RELEASED:
-                q0(self.string['keyboard']['release'].format(K=key, R=release, V=', '.join(keypresses)))
+                return self.string['keyboard']['release'].format(K=key, R=release, V=', '.join(keypresses))
         
         elif message_id == GAMEPAD_REFRESH:
-            q0(self.string['gamepad']['refresh'])
+            return self.string['gamepad']['refresh']
             
         elif message_id == GAMEPAD_AXIS:
             gamepad_id, axis, value = args
-            q0(self.string['gamepad']['axis'].format(N=gamepad_id, A=axis, V=value))
+            return self.string['gamepad']['axis'].format(N=gamepad_id, A=axis, V=value)
         
         #Gamepad button presses
         elif message_id in (GAMEPAD_BUTTON_PRESS, GAMEPAD_BUTTON_HELD, GAMEPAD_BUTTON_RELEASED):
@@ -260,24 +341,24 @@ class Notify(object):
             buttons = [str(id) for id in buttons_ids] #TODO: set button names
             
             if message_id == GAMEPAD_BUTTON_PRESS:
-                q1(self.string['gamepad']['button']['press'].format(N=gamepad_number, B=button, V=', '.join(buttons), P=press))
+                return self.string['gamepad']['button']['press'].format(N=gamepad_number, B=button, V=', '.join(buttons), P=press)
             
             elif message_id == GAMEPAD_BUTTON_HELD:
-                q1(self.string['gamepad']['button']['held'].format(N=gamepad_number, B=button, V=', '.join(buttons), P=press))
+                return self.string['gamepad']['button']['held'].format(N=gamepad_number, B=button, V=', '.join(buttons), P=press)
             
             elif message_id == GAMEPAD_BUTTON_RELEASED:
-                q0(self.string['gamepad']['button']['release'].format(N=gamepad_number, B=button, V=', '.join(buttons), R=release))
+                return self.string['gamepad']['button']['release'].format(N=gamepad_number, B=button, V=', '.join(buttons), R=release)
         
         elif message_id == GAMEPAD_FOUND:
             gamepad_number = args[0]
-            q2(self.string['gamepad']['found'].format(N=gamepad_number))
+            return self.string['gamepad']['found'].format(N=gamepad_number)
             
         elif message_id == GAMEPAD_LOST:
             gamepad_number = args[0]
-            q2(self.string['gamepad']['lost'].format(N=gamepad_number))
+            return self.string['gamepad']['lost'].format(N=gamepad_number)
             
         elif message_id == APPLICATION_STARTED:
-            q2(self.string['application']['start'].format(A=args[0][0]))
+            return self.string['application']['start'].format(A=args[0][0])
         
         #Application changes
         elif message_id in (APPLICATION_LOADING, APPLICATION_QUIT, APPLICATION_FOCUSED, APPLICATION_UNFOCUSED):
@@ -289,107 +370,141 @@ class Notify(object):
                 application = DEFAULT_NAME
             
             if message_id == APPLICATION_LOADING:
-                q2(self.string['application']['load'].format(A=application))
+                return self.string['application']['load'].format(A=application)
                 
             if message_id == APPLICATION_QUIT:
-                q2(self.string['application']['quit'].format(A=application))
+                return self.string['application']['quit'].format(A=application)
             
             if message_id == APPLICATION_FOCUSED:
-                q1(self.string['application']['focused'].format(A=application))
+                return self.string['application']['focused'].format(A=application)
             
             if message_id == APPLICATION_UNFOCUSED:
-                q1(self.string['application']['unfocused'].format(A=application))
+                return self.string['application']['unfocused'].format(A=application)
             
             
         elif message_id == APPLICATION_RELOAD:
-            q1(self.string['application']['reload'])
+            return self.string['application']['reload']
             
         elif message_id == APPLICATION_LISTEN:
-            q1(self.string['application']['listen'])
+            return self.string['application']['listen']
             
         elif message_id == APPLIST_UPDATE_START:
-            q1(self.string['application']['update']['start'])
+            return self.string['application']['update']['start']
             
         elif message_id == APPLIST_UPDATE_SUCCESS:
-            q1(self.string['application']['update']['success'])
+            return self.string['application']['update']['success']
             
         elif message_id == APPLIST_UPDATE_FAIL:
-            q1(self.string['application']['update']['fail'])
+            return self.string['application']['update']['fail']
             
         elif message_id == SAVE_START:
-            q2(self.string['save']['start'])
+            return self.string['save']['start']
             
         elif message_id == SAVE_SUCCESS:
-            q2(self.string['save']['success'])
+            return self.string['save']['success']
             
         elif message_id == SAVE_FAIL:
-            q2(self.string['save']['fail']['noretry'])
+            return self.string['save']['fail']['noretry']
             
         elif message_id == SAVE_FAIL_RETRY:
             second = get_plural(self.word['second'], args[0])
-            q2(self.string['save']['fail']['retry'].format(T=args[0], S=second, C=args[1] + 1, M=args[2]))
+            return self.string['save']['fail']['retry'].format(T=args[0], S=second, C=args[1] + 1, M=args[2])
             
         elif message_id == SAVE_FAIL_END:
-            q2(self.string['save']['fail']['end'])
+            return self.string['save']['fail']['end']
             
         elif message_id == SAVE_SKIP:
             save_frequency, queue_size = args
             if queue_size > 2:
-                q2(self.string['save']['skip']['nochange'])
+                return self.string['save']['skip']['nochange']
             else:
                 second = get_plural(self.word['second'], args[0])
-                q2(self.string['save']['skip']['inactive'].format(T=save_frequency, S=second))
+                return self.string['save']['skip']['inactive'].format(T=save_frequency, S=second)
                 
         elif message_id == SAVE_PREPARE:
-            q2(self.string['save']['prepare'])
+            return self.string['save']['prepare']
+            
+        elif message_id in (SAVE_BACKGROUND_SUCCESS, SAVE_BACKGROUND_FAIL):
+            try:
+                application = args[0][0]
+                if application is None:
+                    raise TypeError()
+            except (IndexError, TypeError):
+                application = DEFAULT_NAME
+            if message_id == SAVE_BACKGROUND_SUCCESS:
+                return self.string['save']['background']['success'].format(A=application)
+            return self.string['save']['background']['fail'].format(A=application)
             
         elif message_id == START_MAIN:
-            q2(self.string['script']['main']['start'])
+            return self.string['script']['main']['start']
             
         elif message_id == START_THREAD:
-            q2(self.string['script']['thread']['start'])
+            return self.string['script']['thread']['start']
             
         elif message_id == DATA_LOADED:
-            q1(self.string['profile']['load'])
+            return self.string['profile']['load']
             
         elif message_id == DATA_NOTFOUND:
-            q1(self.string['profile']['new'])
+            return self.string['profile']['new']
+            
+        elif message_id == DATA_CACHED:
+            return self.string['profile']['cached']
             
         elif message_id == MT_PATH:
-            q2(self.string['path'].format(P=format_file_path(DEFAULT_PATH)))
+            return self.string['path'].format(P=format_file_path(DEFAULT_PATH))
             
         elif message_id == QUEUE_SIZE:
             command = get_plural(self.word['command'], args[0])
-            q1(self.string['queue'].format(N=args[0], C=command))
+            return self.string['queue'].format(N=args[0], C=command)
+            
+        elif message_id == FRAME_STATS:
+            frames, mean, percentile, max_time, overruns, overrun_percentile, dropped = args
+            return self.string['frames'].format(N=frames, A=round(mean, 2), P=percentile, M=round(max_time, 2),
+                                                O=overruns, L=round(overrun_percentile, 2), D=dropped)
             
         elif message_id == PROCESS_EXIT:
-            q2(self.string['script']['main']['end'])
+            return self.string['script']['main']['end']
             
         elif message_id == THREAD_EXIT:
-            q2(self.string['script']['thread']['end'])
+            return self.string['script']['thread']['end']
             
         elif message_id == PROCESS_NOT_UNIQUE:
-            q2(self.string['script']['process']['duplicate'])
-        
-        return self
-
-    def get_output(self):
-        allowed_levels = range(CONFIG['Advanced']['MessageLevel'], 3)
-        output = [capitalize(u' | '.join(self.message_queue[i])) for i in allowed_levels][::-1]
-        message = u' | '.join(i for i in output if i)
+            return self.string['script']['process']['duplicate']
+    
+    def format_events(self, events):
+        """Convert a list of events to a single line of text.
+        The most important messages are shown first.
+        """
+        output = {0: [], 1: [], 2: []}
+        for message_id, args, timestamp in events:
+            level = MESSAGE_LEVELS.get(message_id, 2)
+            if level >= self.level:
+                text = self._format(message_id, args)
+                if text:
+                    output[level].append(text)
+        lines = [capitalize(u' | '.join(output[level])) for level in (2, 1, 0)]
+        return u' | '.join(i for i in lines if i)
+    
+    def _print_debug(self):
         for msg in self._debug:
             print(u', '.join(map(str, msg)))
-                
+
+    def get_output(self):
+        message = self.format_events(self.events)
+        self._print_debug()
         self.reset()
         return message
 
     def send(self, q):
-        output = self.get_output()
-        if output:
-            q.put(output)
+        """Send the events to be formatted by another process."""
+        events = self.events
+        self._print_debug()
+        self.reset()
+        if events:
+            q.put({'Notify': events})
 
     def reset(self):
-        self.message_queue = {0: [], 1: [], 2: []}
+        self.events = []
         self._debug = []
 
     
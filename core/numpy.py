@@ -5,9 +5,12 @@ Source: https://github.com/Peter92/MouseTracks
 
 from __future__ import division, absolute_import
 
+from itertools import count as _count
+from numbers import Integral
+
 import numpy
 
-from core.compatibility import StringIO, BytesIO
+from core.compatibility import StringIO, BytesIO, get_items
 
 
 _NUMPY_DTYPES = {
@@ -33,6 +36,19 @@ _NUMPY_DTYPES = {
 }
 
 
+#Shared between all arrays, so that a generation number is never reused
+_GENERATIONS = _count(1)
+
+_UNSIGNED_DTYPES = (numpy.uint8, numpy.uint16, numpy.uint32, numpy.uint64)
+
+_SIGNED_DTYPES = (numpy.int8, numpy.int16, numpy.int32, numpy.int64)
+
+
+def new_generation():
+    """Get a number to mark that an array has changed."""
+    return next(_GENERATIONS)
+
+
 def _get_dtype(dtype):
     try:
         return _NUMPY_DTYPES[dtype]
@@ -40,6 +56,39 @@ def _get_dtype(dtype):
         return None
 
 
+def fit_dtype(dtype, min_value, max_value):
+    """Get the smallest integer dtype that can hold a range of values,
+    and is at least as wide as the current one.
+    Unsigned types will become signed if a value is negative.
+    Any other dtypes are returned unchanged.
+    """
+    dtype = numpy.dtype(dtype)
+    if dtype.kind not in 'iu':
+        return dtype
+    if dtype.kind == 'u' and min_value >= 0:
+        options = _UNSIGNED_DTYPES
+    else:
+        options = _SIGNED_DTYPES
+    for option in options:
+        option = numpy.dtype(option)
+        limits = numpy.iinfo(option)
+        if option.itemsize >= dtype.itemsize and limits.min <= min_value and max_value <= limits.max:
+            return option
+    raise OverflowError('values from {} to {} are too large for any dtype'.format(min_value, max_value))
+
+
+def _compact_dtype(array, default):
+    """Get the smallest dtype that can hold the values of an existing array.
+    This is only done if every value is a whole number.
+    """
+    if not array.size or array.dtype.kind not in 'iuf':
+        return numpy.dtype(default)
+    min_value, max_value = numpy.amin(array), numpy.amax(array)
+    if array.dtype.kind == 'f' and not (numpy.floor(array) == array).all():
+        return array.dtype
+    return fit_dtype(default, int(min_value), int(max_value))
+
+
 def set_type(array, dtype):
     if isinstance(dtype, str):
         return array.astype(_get_dtype(dtype))
@@ -47,14 +96,47 @@ def set_type(array, dtype):
         return array.astype(dtype)
         
         
-def array(array, create=False, dtype=None):
+def array(array, create=False, dtype=None, tiled=False, sparse=False):
     if create:
+        if tiled:
+            return TiledArray(array[::-1], dtype=dtype)
+        if sparse:
+            return SparseArray(array[::-1], dtype=dtype)
         return numpy.zeros(array[::-1], dtype=_get_dtype(dtype))
     return numpy.array(array, dtype=_get_dtype(dtype))
 
+
+def densify(array, dtype=None):
+    """Convert a tiled or sparse array to a normal one."""
+    if isinstance(array, (TiledArray, SparseArray)):
+        array = array.densify()
+    if dtype is not None:
+        return set_type(array, dtype)
+    return array
+
     
-def count(array):
-    return (array > 0).sum()
+def count(array, axis=None):
+    if isinstance(array, (TiledArray, SparseArray)):
+        return array.count()
+    return (array > 0).sum(axis=axis)
+
+
+def concatenate(arrays, axis=0):
+    return numpy.concatenate(arrays, axis=axis)
+
+
+def column_stack(arrays):
+    return numpy.column_stack(arrays)
+
+
+def add_at(array, index, value):
+    """Add to an array in place, including any repeated indexes."""
+    numpy.add.at(array, index, value)
+
+
+def nonzero(array):
+    """Get the indexes of all values above 0 in a flattened array."""
+    return numpy.flatnonzero(array > 0)
     
     
 def mean(array):
@@ -67,6 +149,8 @@ def sum(array):
     
 def min(array, value=None):
     if value is None:
+        if isinstance(array, (TiledArray, SparseArray)):
+            return array.min()
         return numpy.amin(array)
     array[array > value] = value
     return array
@@ -74,6 +158,8 @@ def min(array, value=None):
     
 def max(array, value=None):
     if value is None:
+        if isinstance(array, (TiledArray, SparseArray)):
+            return array.max()
         return numpy.amax(array)
     array[array < value] = value
     return array
@@ -165,7 +251,12 @@ def csv(array):
 
 def save(array):
     f = BytesIO()
-    numpy.save(f, array, fix_imports=True)
+    if isinstance(array, (TiledArray, SparseArray)):
+        numpy.savez(f, **array.to_arrays())
+    elif isinstance(array, dict):
+        numpy.savez(f, **array)
+    else:
+        numpy.save(f, array, fix_imports=True)
     return f.getvalue()
 
     
@@ -173,9 +264,606 @@ def load(saved_array):
     f = BytesIO()
     f.write(saved_array)
     f.seek(0)
-    return numpy.load(f)
+    loaded = numpy.load(f)
+    
+    #Tiled and sparse arrays are saved as multiple arrays
+    if isinstance(loaded, numpy.lib.npyio.NpzFile):
+        with loaded:
+            if 'tiles' in loaded.files:
+                return TiledArray.from_arrays(loaded)
+            return SparseArray.from_arrays(loaded)
+    return loaded
+
+
+def load_arrays(saved_arrays):
+    """Load a dict of arrays, saved with save()."""
+    with numpy.load(BytesIO(saved_arrays)) as loaded:
+        return {name: loaded[name] for name in loaded.files}
     
 
 def fill(array, value):
     array.fill(value)
-    return array
\ No newline at end of file
+    return array
+
+def calculate_lines(starts, ends, index=False):
+    """Calculate the pixels along multiple lines at once.
+    This follows the same path as maths.calculate_line, but both the
+    start and end points are included.
+    
+    Each column steps up by the slope, so the height of a column is the
+    running total of the slope. This is kept as a fraction of whole
+    numbers, so a line that passes exactly through a pixel corner always
+    takes the step in the same column. calculate_line adds the slope as
+    a float, so it may take that step one column later.
+    
+    Returns:
+        Flat arrays of the x and y coordinates of every pixel, in order of each line.
+        If index is set, an array of which line each pixel belongs to is also returned.
+    """
+    starts = numpy.round(numpy.asarray(starts, dtype=numpy.float64)).astype(numpy.int64).reshape(-1, 2)
+    ends = numpy.round(numpy.asarray(ends, dtype=numpy.float64)).astype(numpy.int64).reshape(-1, 2)
+    difference = ends - starts
+    direction = numpy.where(difference < 0, -1, 1)
+    width, height = numpy.abs(difference).T
+    
+    #Every line has at least one column, and the end point is added as an extra column
+    has_end = (width > 0) | (height > 0)
+    columns = numpy.maximum(width, 1)
+    total_columns = columns + has_end
+    first_column = numpy.cumsum(total_columns) - total_columns
+    column_count = total_columns.sum()
+    column_x = numpy.arange(column_count) - numpy.repeat(first_column, total_columns)
+    
+    #Add up the slope of every column before (low) and including (high) each one
+    column_height = numpy.repeat(height, total_columns)
+    column_width = numpy.repeat(columns, total_columns)
+    low = column_x * column_height // column_width
+    high = (column_x + 1) * column_height // column_width
+    
+    #The last column stops once it's next to the end point
+    #A single diagonal step is the exception, as the start point is never checked
+    last = first_column + columns - 1
+    high[last] = numpy.maximum(low[last], height - 1)
+    high[last[(width == 1) & (height == 1)]] = 1
+    
+    #Add the end points
+    ends_index = (first_column + columns)[has_end]
+    column_x[ends_index] = width[has_end]
+    low[ends_index] = high[ends_index] = height[has_end]
+    
+    #Convert the columns to pixels
+    lengths = high - low + 1
+    pixel_column = numpy.repeat(numpy.arange(column_count), lengths)
+    pixel_y = low[pixel_column] + numpy.arange(lengths.sum()) - numpy.repeat(numpy.cumsum(lengths) - lengths, lengths)
+    segments = numpy.repeat(numpy.arange(len(total_columns)), total_columns)[pixel_column]
+    x = starts[segments, 0] + direction[segments, 0] * column_x[pixel_column]
+    y = starts[segments, 1] + direction[segments, 1] * pixel_y
+    if index:
+        return x, y, segments
+    return x, y
+
+
+def last_unique(array):
+    """Get the index of the last occurrence of each unique value."""
+    reverse_index = numpy.unique(array[::-1], return_index=True)[1]
+    return len(array) - 1 - reverse_index
+
+
+class TiledArray(object):
+    """2D array that is split into tiles, which are only allocated once written to.
+    
+    Most resolutions only ever have data in a small area (such as an application
+    that was only open for a short time), so this saves storing a full array for them.
+    Indexing works with [y, x], where both can either be integers or arrays.
+    Anything that hasn't been written to is 0.
+    
+    The values start as uint32, and the dtype is widened if anything larger is written.
+    
+    Changes to every value (compress and rebase) are queued instead of being
+    done all at once. Each tile is updated the next time it is used,
+    or a few at a time with refresh.
+    
+    A snapshot shares its tiles with the original, and each tile is only
+    copied once either of them writes to it.
+    
+    The generation changes whenever the array is written to, so a save
+    can tell which arrays are the same as last time.
+    """
+    def __init__(self, shape, dtype=None, tile_size=64):
+        self.shape = tuple(int(i) for i in shape)
+        self.dtype = numpy.dtype(_get_dtype(dtype) or numpy.uint32)
+        self.tile_size = tile_size
+        self.tiles = {}
+        self._tile_count = (-(-self.shape[0] // tile_size), -(-self.shape[1] // tile_size))
+        self._changes = []
+        self._stale = {}
+        self._shared = set()
+        self.generation = new_generation()
+    
+    def __repr__(self):
+        return '<TiledArray shape={} tiles={}/{}>'.format(self.shape, len(self.tiles), 
+                                                          self._tile_count[0] * self._tile_count[1])
+    
+    @property
+    def nbytes(self):
+        return numpy.sum([tile.nbytes for tile in self.tiles.values()], dtype=numpy.int64)
+    
+    @property
+    def stale(self):
+        """Get how many tiles still have queued changes."""
+        return len(self._stale)
+    
+    def _writable(self, coordinate):
+        """Get a tile to write to, copying it first if it's shared with a snapshot."""
+        tile = self.tiles[coordinate]
+        if coordinate in self._shared:
+            self._shared.discard(coordinate)
+            tile = self.tiles[coordinate] = tile.copy()
+        return tile
+    
+    def _update(self, coordinate):
+        """Apply any queued changes to a tile."""
+        tile = self._writable(coordinate)
+        used = tile > 0
+        values = tile[used]
+        for change, amount in self._changes[self._stale.pop(coordinate):]:
+            if change == 'compress':
+                values = numpy.floor_divide(values, amount)
+            
+            #Anything that was compressed to 0 is left alone
+            elif change == 'rebase':
+                values = numpy.where(values > 0, numpy.maximum(values, amount + 1) - amount, 0)
+        tile[used] = values
+        
+        if not self._stale:
+            self._changes = []
+        return tile
+    
+    def _tile(self, coordinate):
+        """Get an existing tile, making sure it is up to date."""
+        if coordinate in self._stale:
+            return self._update(coordinate)
+        return self.tiles[coordinate]
+    
+    def _queue_change(self, change, amount):
+        """Queue a change to every value above 0."""
+        self.generation = new_generation()
+        index = len(self._changes)
+        for coordinate in self.tiles:
+            if coordinate not in self._stale:
+                self._stale[coordinate] = index
+        self._changes.append((change, amount))
+    
+    def refresh(self, limit=None):
+        """Apply the queued changes to a number of tiles, or all of them.
+        Returns how many tiles were updated.
+        """
+        coordinates = list(self._stale)
+        if limit is not None:
+            coordinates = coordinates[:limit]
+        for coordinate in coordinates:
+            self._update(coordinate)
+        return len(coordinates)
+    
+    def _view(self, ty, tx):
+        """Get a tile without the padding past the edge of the array."""
+        height = self.shape[0] - ty * self.tile_size
+        width = self.shape[1] - tx * self.tile_size
+        return self._tile((ty, tx))[:height, :width]
+    
+    def _get_tile(self, ty, tx):
+        """Get a tile to write to, allocating it if it doesn't exist yet."""
+        try:
+            self._tile((ty, tx))
+        except KeyError:
+            tile = self.tiles[(ty, tx)] = numpy.zeros((self.tile_size, self.tile_size), dtype=self.dtype)
+            return tile
+        return self._writable((ty, tx))
+    
+    def _fit(self, value):
+        """Widen the dtype if needed before writing a value."""
+        if self.dtype.kind not in 'iu':
+            return
+        dtype = fit_dtype(self.dtype, numpy.amin(value), numpy.amax(value))
+        if dtype != self.dtype:
+            self.dtype = dtype
+            for coordinate, tile in get_items(self.tiles):
+                self.tiles[coordinate] = tile.astype(dtype)
+            self._shared = set()
+    
+    def _check_bounds(self, y, x):
+        if (numpy.any(y < 0) or numpy.any(y >= self.shape[0])
+                or numpy.any(x < 0) or numpy.any(x >= self.shape[1])):
+            raise IndexError('index out of bounds for array of shape {}'.format(self.shape))
+    
+    def _split(self, y, x):
+        """Group array coordinates by the tile they belong to.
+        
+        Yields:
+            Tile coordinates, and the indexes of the coordinates in that tile.
+        """
+        tile_ids = (y // self.tile_size) * self._tile_count[1] + x // self.tile_size
+        order = numpy.argsort(tile_ids, kind='mergesort')
+        sorted_ids = tile_ids[order]
+        starts = numpy.flatnonzero(numpy.diff(sorted_ids)) + 1
+        for start, end in zip(numpy.concatenate(([0], starts)), numpy.concatenate((starts, [len(order)]))):
+            tile_id = int(sorted_ids[start])
+            yield divmod(tile_id, self._tile_count[1]), order[start:end]
+    
+    def __getitem__(self, key):
+        y, x = key
+        size = self.tile_size
+        
+        #Return a Python number so that increments can't overflow
+        if isinstance(y, Integral) and isinstance(x, Integral):
+            self._check_bounds(y, x)
+            try:
+                return self._tile((y // size, x // size))[y % size, x % size].item()
+            except KeyError:
+                return 0
+        
+        y, x = numpy.broadcast_arrays(numpy.asarray(y), numpy.asarray(x))
+        self._check_bounds(y, x)
+        result = numpy.zeros(y.shape, dtype=self.dtype)
+        y_flat, x_flat, result_flat = y.ravel(), x.ravel(), result.reshape(-1)
+        for tile_coordinate, indexes in self._split(y_flat, x_flat):
+            try:
+                tile = self._tile(tile_coordinate)
+            except KeyError:
+                continue
+            result_flat[indexes] = tile[y_flat[indexes] % size, x_flat[indexes] % size]
+        return result
+    
+    def __setitem__(self, key, value):
+        y, x = key
+        size = self.tile_size
+        
+        self.generation = new_generation()
+        if isinstance(y, Integral) and isinstance(x, Integral):
+            self._check_bounds(y, x)
+            self._fit(value)
+            self._get_tile(y // size, x // size)[y % size, x % size] = value
+            return
+        
+        y, x, value = numpy.broadcast_arrays(numpy.asarray(y), numpy.asarray(x), numpy.asarray(value))
+        self._check_bounds(y, x)
+        if value.size:
+            self._fit(value)
+        y_flat, x_flat, value_flat = y.ravel(), x.ravel(), value.ravel()
+        for (ty, tx), indexes in self._split(y_flat, x_flat):
+            self._get_tile(ty, tx)[y_flat[indexes] % size, x_flat[indexes] % size] = value_flat[indexes]
+    
+    def count(self):
+        """Count the number of values above 0."""
+        return int(numpy.sum([(self._tile(coordinate) > 0).sum() for coordinate in list(self.tiles)], dtype=numpy.int64))
+    
+    def rebase(self, offset):
+        """Subtract an amount from every value above 0.
+        Values are kept at a minimum of 1, so nothing that was written to is lost.
+        """
+        self._queue_change('rebase', offset)
+    
+    def compress(self, amount):
+        """Divide every value above 0 by an amount, rounding down.
+        Old values will gradually fade to 0.
+        """
+        self._queue_change('compress', amount)
+    
+    def min(self):
+        values = [numpy.amin(self._view(*coordinate)) for coordinate in self.tiles]
+        if len(self.tiles) < self._tile_count[0] * self._tile_count[1]:
+            values.append(self.dtype.type(0))
+        return numpy.amin(values)
+    
+    def max(self):
+        values = [numpy.amax(self._view(*coordinate)) for coordinate in self.tiles]
+        if len(self.tiles) < self._tile_count[0] * self._tile_count[1]:
+            values.append(self.dtype.type(0))
+        return numpy.amax(values)
+    
+    def densify(self):
+        """Convert to a normal array, such as for rendering."""
+        output = numpy.zeros(self.shape, dtype=self.dtype)
+        size = self.tile_size
+        for (ty, tx) in self.tiles:
+            view = self._view(ty, tx)
+            output[ty*size:ty*size+view.shape[0], tx*size:tx*size+view.shape[1]] = view
+        return output
+    
+    def __array__(self, dtype=None):
+        if dtype is None:
+            return self.densify()
+        return self.densify().astype(dtype)
+    
+    def snapshot(self):
+        """Copy the array without copying any tiles, such as to save it in another thread."""
+        new = TiledArray(self.shape, tile_size=self.tile_size)
+        new.dtype = self.dtype
+        new.tiles = dict(self.tiles)
+        new._changes = list(self._changes)
+        new._stale = dict(self._stale)
+        new._shared = set(self.tiles)
+        new.generation = self.generation
+        self._shared.update(self.tiles)
+        return new
+    
+    @classmethod
+    def from_array(cls, array, tile_size=64):
+        """Convert a normal array, skipping any tiles that are empty.
+        The smallest dtype that fits the values is used.
+        """
+        new = cls(array.shape, tile_size=tile_size)
+        new.dtype = _compact_dtype(array, new.dtype)
+        size = tile_size
+        for ty in range(new._tile_count[0]):
+            for tx in range(new._tile_count[1]):
+                section = array[ty*size:(ty+1)*size, tx*size:(tx+1)*size]
+                if section.any():
+                    new._get_tile(ty, tx)[:section.shape[0], :section.shape[1]] = section
+        return new
+    
+    def to_arrays(self):
+        """Convert to a dict of arrays that describe the whole object, for saving."""
+        self.refresh()
+        index = sorted(self.tiles)
+        if index:
+            tiles = numpy.stack([self.tiles[coordinate] for coordinate in index])
+        else:
+            tiles = numpy.zeros((0, self.tile_size, self.tile_size), dtype=self.dtype)
+        return {'shape': numpy.array(self.shape, dtype=numpy.int64),
+                'index': numpy.array(index, dtype=numpy.int64).reshape(-1, 2),
+                'tiles': tiles}
+    
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Rebuild from the output of to_arrays."""
+        tiles = arrays['tiles']
+        new = cls(arrays['shape'], tile_size=tiles.shape[1])
+        new.dtype = tiles.dtype
+        for (ty, tx), tile in zip(arrays['index'], tiles):
+            new.tiles[(int(ty), int(tx))] = tile.copy()
+        return new
+
+
+#Rough size of a dict item with an integer key and value
+_SPARSE_ITEM_BYTES = 100
+
+
+class SparseArray(object):
+    """2D array that only stores the values that aren't 0.
+    
+    The values are stored in a dict with the coordinates packed into a single
+    integer, so incrementing a value is a single lookup.
+    This is meant for the click maps, where only a tiny fraction of pixels get clicked.
+    Indexing works with [y, x], where both can either be integers or arrays.
+    
+    The values are stored as Python numbers, and the dtype is only used when
+    converting to an array. It starts as uint8, and is widened as larger values are written.
+    
+    The first time a value is written in a session, its previous value is stored,
+    so the session can be calculated without writing to a second array.
+    """
+    def __init__(self, shape, dtype=None):
+        self.shape = tuple(int(i) for i in shape)
+        self.dtype = numpy.dtype(_get_dtype(dtype) or numpy.uint8)
+        self.data = {}
+        self.baseline = {}
+        self.generation = new_generation()
+    
+    def __repr__(self):
+        return '<SparseArray shape={} values={}>'.format(self.shape, len(self.data))
+    
+    @property
+    def nbytes(self):
+        """Estimate the memory used, as the values aren't stored in an array."""
+        return (len(self.data) + len(self.baseline)) * _SPARSE_ITEM_BYTES
+    
+    def _key(self, y, x):
+        if not (0 <= y < self.shape[0] and 0 <= x < self.shape[1]):
+            raise IndexError('index out of bounds for array of shape {}'.format(self.shape))
+        return int(y) * self.shape[1] + int(x)
+    
+    def __getitem__(self, key):
+        y, x = key
+        if isinstance(y, Integral) and isinstance(x, Integral):
+            return self.data.get(self._key(y, x), 0)
+            
+        y, x = numpy.broadcast_arrays(numpy.asarray(y), numpy.asarray(x))
+        get = self.data.get
+        values = [get(self._key(*coordinate), 0) for coordinate in zip(y.ravel(), x.ravel())]
+        return numpy.array(values, dtype=self.dtype).reshape(y.shape)
+    
+    def __setitem__(self, key, value):
+        y, x = key
+        if isinstance(y, Integral) and isinstance(x, Integral):
+            coordinates = [(y, x, value)]
+        else:
+            y, x, value = numpy.broadcast_arrays(numpy.asarray(y), numpy.asarray(x), numpy.asarray(value))
+            coordinates = zip(y.ravel(), x.ravel(), value.ravel())
+        
+        self.generation = new_generation()
+        for y, x, value in coordinates:
+            key = self._key(y, x)
+            if key not in self.baseline:
+                self.baseline[key] = self.data.get(key, 0)
+            if value:
+                value = value.item() if isinstance(value, numpy.generic) else value
+                if self.dtype.kind in 'iu':
+                    self.dtype = fit_dtype(self.dtype, value if value < 0 else 0, value)
+                self.data[key] = value
+            else:
+                self.data.pop(key, None)
+    
+    def fill(self, value):
+        if value:
+            raise ValueError('sparse arrays can only be filled with 0')
+        self.data = {}
+        self.baseline = {}
+        self.generation = new_generation()
+    
+    def snapshot(self):
+        """Copy the array, such as to save it in another thread."""
+        new = SparseArray(self.shape)
+        new.dtype = self.dtype
+        new.data = dict(self.data)
+        new.baseline = dict(self.baseline)
+        new.generation = self.generation
+        return new
+    
+    def start_session(self):
+        """Use the current values as the start of a new session."""
+        self.baseline = {}
+        self.generation = new_generation()
+    
+    def session(self):
+        """Get how much each value has changed since the session started, as a new array."""
+        new = SparseArray(self.shape)
+        new.dtype = self.dtype
+        data = self.data
+        for key, value in get_items(self.baseline):
+            difference = data.get(key, 0) - value
+            if difference:
+                new.data[key] = difference
+        return new
+    
+    def count(self):
+        """Count the number of values above 0."""
+        return len([value for value in self.data.values() if value > 0])
+    
+    def min(self):
+        values = list(self.data.values())
+        if len(values) < self.shape[0] * self.shape[1]:
+            values.append(0)
+        return numpy.amin(values)
+    
+    def max(self):
+        values = list(self.data.values())
+        if len(values) < self.shape[0] * self.shape[1]:
+            values.append(0)
+        return numpy.amax(values)
+    
+    def densify(self):
+        """Convert to a normal array, such as for rendering."""
+        output = numpy.zeros(self.shape, dtype=self.dtype)
+        arrays = self.to_arrays()
+        output.reshape(-1)[arrays['keys']] = arrays['values']
+        return output
+    
+    def __array__(self, dtype=None):
+        if dtype is None:
+            return self.densify()
+        return self.densify().astype(dtype)
+    
+    @classmethod
+    def from_array(cls, array):
+        """Convert a normal array, keeping only the values that aren't 0.
+        The smallest dtype that fits the values is used.
+        """
+        new = cls(array.shape)
+        new.dtype = _compact_dtype(array, new.dtype)
+        keys = numpy.flatnonzero(array)
+        new.data = dict(zip(keys.tolist(), array.reshape(-1)[keys].astype(new.dtype).tolist()))
+        return new
+    
+    def to_arrays(self):
+        """Convert to a dict of arrays that describe the whole object, for saving.
+        The keys are sorted so the output is the same every time.
+        """
+        keys = numpy.array(sorted(self.data), dtype=numpy.int64)
+        values = numpy.array([self.data[key] for key in keys.tolist()], dtype=self.dtype)
+        baseline_keys = numpy.array(sorted(self.baseline), dtype=numpy.int64)
+        baseline_values = numpy.array([self.baseline[key] for key in baseline_keys.tolist()], dtype=self.dtype)
+        return {'shape': numpy.array(self.shape, dtype=numpy.int64),
+                'keys': keys,
+                'values': values,
+                'baseline_keys': baseline_keys,
+                'baseline_values': baseline_values}
+    
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Rebuild from the output of to_arrays."""
+        values = arrays['values']
+        new = cls(arrays['shape'])
+        new.dtype = values.dtype
+        new.data = dict(zip(arrays['keys'].tolist(), values.tolist()))
+        try:
+            new.baseline = dict(zip(arrays['baseline_keys'].tolist(), arrays['baseline_values'].tolist()))
+        except KeyError:
+            pass
+        return new
+
+
+class LazyArrays(dict):
+    """Dict of arrays for a resolution, where each array is only created once written to.
+    
+    Reading an array that doesn't exist returns an empty one without storing it,
+    so anything that only reads the data won't allocate anything.
+    Use create to get an array for writing.
+    """
+    def __init__(self, resolution, *args, **kwargs):
+        super(LazyArrays, self).__init__(*args, **kwargs)
+        self.resolution = tuple(resolution)
+    
+    def __missing__(self, key):
+        return array(self.resolution, create=True, sparse=True)
+    
+    def snapshot(self):
+        new = LazyArrays(self.resolution)
+        for key, values in get_items(self):
+            new[key] = values.snapshot()
+        return new
+
+    def create(self, key):
+        """Get an array, creating it if it doesn't exist."""
+        if key not in self:
+            self[key] = array(self.resolution, create=True, sparse=True)
+        return dict.__getitem__(self, key)
+
+
+def log_edges(maximum, count):
+    """Get the lower edges of bins that are spaced logarithmically up to a maximum.
+    The first edge is always 0, and any duplicate integer edges are removed.
+    """
+    edges = numpy.unique(numpy.round(numpy.geomspace(1, maximum, count)).astype('int64'))
+    return numpy.concatenate(([0], edges))
+
+
+def linear_edges(minimum, width, count):
+    """Get the lower edges of a number of bins of equal width."""
+    return minimum + numpy.arange(count, dtype='int64') * width
+
+
+def histogram_index(values, minimum, width, count):
+    """Find which bin each value is in, for bins of equal width.
+    Any values outside of the bins are put in the first or last bin.
+    """
+    index = (numpy.asarray(values, dtype='int64') - minimum) // width
+    return numpy.clip(index, 0, count - 1)
+
+
+def histogram_percentile(edges, counts, percentile):
+    """Estimate a percentile from histogram counts, where each bin goes
+    from edges[i] up to edges[i+1], and the last bin has no upper limit.
+    Values are assumed to be spread out evenly within each bin.
+    """
+    cumulative = numpy.cumsum(counts)
+    if not len(cumulative) or cumulative[-1] <= 0:
+        return None
+    target = cumulative[-1] * percentile / 100
+    
+    #Find the first bin containing the target
+    i = int(numpy.argmax((cumulative >= target) & (counts > 0)))
+    if i == len(edges) - 1:
+        return float(edges[i])
+    previous = cumulative[i - 1] if i else 0
+    fraction = (target - previous) / counts[i]
+    return float(edges[i] + fraction * (edges[i + 1] - edges[i]))
+
+
+def bin_index(edges, values):
+    """Find which bin each value is in, where bin i goes from edges[i] up to edges[i+1].
+    Any values outside of the edges are set to -1.
+    """
+    index = numpy.searchsorted(edges, values, side='right') - 1
+    index[index >= len(edges) - 1] = -1
+    return index
@@ -180,6 +180,11 @@ KEYS = {
 }
 for c in list('ABCDEFGHIJKLMNOPQRSTUVWXYZ1234567890'):
     KEYS[c] = ord(c)
+
+#Reverse lookup and bitmask of the keys, to use with get_key_states
+KEY_NAMES = {code: name for name, code in KEYS.items()}
+
+KEY_MASK = sum(1 << code for code in KEY_NAMES)
     
 
 #Load in modules from operating system
@@ -205,6 +210,16 @@ elif OPERATING_SYSTEM == 'Darwin':
 else:
     raise ImportError('unknown operating system: "{}"'.format(OPERATING_SYSTEM))
 
+#Read the input from a trace file instead, if one is set
+#The speed is a multiplier of the normal update rate, and 0 is as fast as possible
+REPLAY_FILE = os.getenv('MOUSETRACKS_REPLAY')
+REPLAY_SPEED = float(os.getenv('MOUSETRACKS_REPLAY_SPEED', 1))
+if REPLAY_FILE:
+    from core.os.replay import replay_functions
+    locals().update(replay_functions(REPLAY_FILE))
+else:
+    REPLAY_SPEED = 1
+
 #Import placeholders if the function doesn't exist in the namespace
 def _add_placeholders(variables, functions_only=False):
     """Use placeholder functions if the counterpart doesn't exist."""
@@ -226,6 +241,7 @@ try:
     get_cursor_pos
     get_mouse_click
     get_key_press
+    get_key_states
     hide_file
     get_running_processes
     get_documents_path
@@ -250,6 +266,13 @@ try:
 except NameError:
     raise ImportError('failed to import required modules for the current operating system')
 
+#Record the input to a trace file, so it can be replayed later
+RECORD_FILE = os.getenv('MOUSETRACKS_RECORD')
+if RECORD_FILE and not REPLAY_FILE:
+    from core.constants import UPDATES_PER_SECOND
+    from core.os.replay import record_functions
+    locals().update(record_functions(RECORD_FILE, locals(), UPDATES_PER_SECOND, MULTI_MONITOR))
+
     
 if FOCUS_DETECTION:
 
@@ -5,11 +5,82 @@ Source: https://github.com/Peter92/MouseTracks
 
 from __future__ import absolute_import
 
-from Xlib import display
+from Xlib import display, XK
 
 from core.os.linux.xlib.pyxhook import HookManager
 
 
+#X keysym names for each of the key codes in core.os.KEYS
+_KEYSYMS = {
+    8: 'BackSpace',
+    9: 'Tab',
+    12: 'Clear',
+    13: 'Return',
+    19: 'Pause',
+    20: 'Caps_Lock',
+    27: 'Escape',
+    32: 'space',
+    33: 'Prior',
+    34: 'Next',
+    35: 'End',
+    36: 'Home',
+    37: 'Left',
+    38: 'Up',
+    39: 'Right',
+    40: 'Down',
+    45: 'Insert',
+    46: 'Delete',
+    91: 'Super_L',
+    92: 'Super_R',
+    93: 'Menu',
+    106: 'KP_Multiply',
+    107: 'KP_Add',
+    109: 'KP_Subtract',
+    110: 'KP_Decimal',
+    111: 'KP_Divide',
+    144: 'Num_Lock',
+    145: 'Scroll_Lock',
+    160: 'Shift_L',
+    161: 'Shift_R',
+    162: 'Control_L',
+    163: 'Control_R',
+    164: 'Alt_L',
+    165: 'Alt_R',
+    186: 'semicolon',
+    187: 'equal',
+    188: 'comma',
+    189: 'minus',
+    190: 'period',
+    191: 'slash',
+    192: 'apostrophe',
+    219: 'bracketleft',
+    220: 'backslash',
+    221: 'bracketright',
+    222: 'numbersign',
+    223: 'grave'
+}
+for i in range(10):
+    _KEYSYMS[96 + i] = 'KP_{}'.format(i)
+for i in range(24):
+    _KEYSYMS[112 + i] = 'F{}'.format(i + 1)
+for c in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ1234567890':
+    _KEYSYMS[ord(c)] = c.lower()
+
+_DISPLAY = display.Display()
+
+
+def _get_key_bits():
+    """Map each X keycode to the bitmask of the key codes it belongs to."""
+    key_bits = {}
+    for code, name in _KEYSYMS.items():
+        keycode = _DISPLAY.keysym_to_keycode(XK.string_to_keysym(name))
+        if keycode:
+            key_bits[keycode] = key_bits.get(keycode, 0) | 1 << code
+    return key_bits
+    
+_KEY_BITS = _get_key_bits()
+
+
 def get_resolution():
     d = display.Display().screen()
     return (d.width_in_pixels, d.height_in_pixels)
@@ -18,6 +89,22 @@ def get_resolution():
 def get_cursor_pos():
     d = display.Display().screen().root.query_pointer()
     return (d.root_x, d.root_y)
+
+
+def get_key_states():
+    """Get the state of every key at once.
+    XQueryKeymap returns one bit for each X keycode, so only the bytes
+    with a key held down need converting.
+    Returns:
+        Integer bitmask, where bit n is set if the key with the code n is pressed.
+    """
+    key_states = 0
+    for i, byte in enumerate(_DISPLAY.query_keymap()):
+        if byte:
+            for bit in range(8):
+                if byte >> bit & 1:
+                    key_states |= _KEY_BITS.get(i * 8 + bit, 0)
+    return key_states
     
     
 class _MouseClick(HookManager):
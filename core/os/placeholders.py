@@ -30,7 +30,7 @@ def get_running_processes():
     return {}
 
     
-def hide_file():
+def hide_file(file_name):
     """Set a file as hidden."""
     return None
     
@@ -72,6 +72,21 @@ def get_key_press(key):
         True/False if the selected key has been pressed or not.
     """
     return False
+
+
+def get_key_states():
+    """Get the state of every key at once.
+    This falls back to checking each key one at a time, which is still
+    used on Mac as there's no single call for the whole keyboard there.
+    Returns:
+        Integer bitmask, where bit n is set if the key with the code n is pressed.
+    """
+    from core.os import KEYS, get_key_press
+    key_states = 0
+    for code in KEYS.values():
+        if get_key_press(code):
+            key_states |= 1 << code
+    return key_states
     
     
 def get_documents_path():
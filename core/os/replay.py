@@ -0,0 +1,244 @@
+"""
+This is part of the Mouse Tracks Python application.
+Source: https://github.com/Peter92/MouseTracks
+"""
+#Record and replay the input from a session, so the tracking can be tested without a real user
+
+from __future__ import absolute_import
+
+import atexit
+import os
+import struct
+from binascii import hexlify
+
+from core.compatibility import range
+
+
+MAGIC = b'MTTRACE\x01'
+
+RECORD_FRAME = 0
+
+RECORD_MONITORS = 1
+
+#(updates per second, double click time, multiple monitors)
+_HEADER = struct.Struct('<HH?')
+
+#(type, x, y, mouse buttons, key states)
+_FRAME = struct.Struct('<BiiB32s')
+
+#(type, number of monitors)
+_MONITORS = struct.Struct('<BH')
+
+_MONITOR = struct.Struct('<iiii')
+
+#Set in the mouse buttons if the cursor position could not be read
+_NO_CURSOR = 128
+
+
+class ReplayFinished(KeyboardInterrupt):
+    """Raised when the end of a trace is reached.
+    It subclasses KeyboardInterrupt so it isn't caught by anything expecting normal errors.
+    The tracking then waits for the background process to save before exiting.
+    """
+    pass
+
+
+class TraceRecorder(object):
+    """Write input to a trace file.
+    This can be used directly to create a synthetic trace, or with record_functions
+    to capture a live session.
+    """
+    def __init__(self, file_name, updates_per_second, double_click_time=500, multi_monitor=False):
+        self.file = open(file_name, 'wb')
+        self.file.write(MAGIC)
+        self.file.write(_HEADER.pack(updates_per_second, double_click_time, multi_monitor))
+        self.monitors = None
+        atexit.register(self.close)
+
+    def write_frame(self, cursor_pos, mouse_click=(False, False, False), key_states=0):
+        """Write the input for a single tick."""
+        buttons = sum(1 << i for i, clicked in enumerate(mouse_click) if clicked)
+        if cursor_pos is None:
+            x = y = 0
+            buttons |= _NO_CURSOR
+        else:
+            x, y = cursor_pos
+        keys = bytearray((key_states >> (8 * i)) & 255 for i in range(32))
+        self.file.write(_FRAME.pack(RECORD_FRAME, int(x), int(y), buttons, bytes(keys)))
+
+    def write_monitors(self, monitors):
+        """Write the monitor locations, only if they have changed."""
+        monitors = [tuple(monitor) for monitor in monitors]
+        if monitors == self.monitors:
+            return
+        self.monitors = monitors
+        self.file.write(_MONITORS.pack(RECORD_MONITORS, len(monitors)))
+        for monitor in monitors:
+            self.file.write(_MONITOR.pack(*monitor))
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+class TraceReader(object):
+    """Read input from a trace file one tick at a time."""
+    def __init__(self, file_name):
+        with open(file_name, 'rb') as f:
+            self.data = f.read()
+        if not self.data.startswith(MAGIC):
+            raise ValueError('"{}" is not a valid trace file'.format(file_name))
+
+        offset = len(MAGIC)
+        self.updates_per_second, self.double_click_time, self.multi_monitor = _HEADER.unpack_from(self.data, offset)
+        self.offset = offset + _HEADER.size
+
+        self.cursor_pos = None
+        self.mouse_click = (False, False, False)
+        self.key_states = 0
+        self.monitors = []
+
+        #Read anything before the first frame, such as the monitors
+        self._read_records()
+        self.frames = 0
+
+    def _read_records(self):
+        """Read all the records up to the next frame.
+        The offset is left at the start of the frame.
+        """
+        data = self.data
+        while self.offset < len(data):
+            record_type = data[self.offset:self.offset + 1]
+
+            if record_type == b'\x01':
+                count = _MONITORS.unpack_from(data, self.offset)[1]
+                self.offset += _MONITORS.size
+                self.monitors = [_MONITOR.unpack_from(data, self.offset + i * _MONITOR.size) for i in range(count)]
+                self.offset += count * _MONITOR.size
+
+            elif record_type == b'\x00':
+                return _FRAME.unpack_from(data, self.offset)
+
+            else:
+                raise ValueError('unknown record in trace file at {}'.format(self.offset))
+        return None
+
+    def next_frame(self):
+        """Move to the next tick of the trace."""
+        frame = self._read_records()
+        if frame is None:
+            raise ReplayFinished('reached the end of the trace after {} frames'.format(self.frames))
+        self.offset += _FRAME.size
+        self.frames += 1
+
+        _, x, y, buttons, keys = frame
+        self.cursor_pos = None if buttons & _NO_CURSOR else (x, y)
+        self.mouse_click = tuple(bool(buttons & (1 << i)) for i in range(3))
+        self.key_states = int(hexlify(keys[::-1]), 16)
+
+
+def record_functions(file_name, functions, updates_per_second, multi_monitor):
+    """Wrap the input functions so that everything they return is recorded.
+    Each call to get_cursor_pos is treated as the start of a new tick.
+
+    The file is only created on the first call to get_cursor_pos,
+    so importing this from anywhere other than the tracking won't overwrite it.
+    """
+    get_cursor_pos = functions['get_cursor_pos']
+    get_mouse_click = functions['get_mouse_click']
+    get_key_states = functions['get_key_states']
+    monitor_info = functions['monitor_info']
+    get_double_click_time = functions['get_double_click_time']
+
+    #Python 2 can't assign to outer variables, so use a dict
+    recording = {'Recorder': None, 'PID': None, 'Monitors': None, 'Frame': {}}
+
+    def _recording():
+        return recording['Recorder'] is not None and recording['PID'] == os.getpid()
+
+    def _write_frame():
+        frame = recording['Frame']
+        if frame and _recording():
+            recording['Recorder'].write_frame(frame['Cursor'], frame.get('Click', (False, False, False)), frame.get('Keys', 0))
+        frame.clear()
+
+    def _write_monitors():
+        monitors = recording['Monitors']
+        if monitors is None:
+            monitors = recording['Monitors'] = monitor_info()
+        if not multi_monitor:
+            monitors = [(0, 0, monitors[0], monitors[1])]
+        recording['Recorder'].write_monitors(monitors)
+
+    def record_cursor_pos():
+        result = get_cursor_pos()
+        if recording['Recorder'] is None:
+            recording['Recorder'] = TraceRecorder(file_name, updates_per_second, get_double_click_time(), multi_monitor)
+            recording['PID'] = os.getpid()
+            atexit.register(_write_frame)
+            _write_monitors()
+        _write_frame()
+        recording['Frame']['Cursor'] = result
+        return result
+
+    def record_mouse_click():
+        result = get_mouse_click()
+        recording['Frame']['Click'] = result
+        return result
+
+    def record_key_states():
+        result = get_key_states()
+        recording['Frame']['Keys'] = result
+        return result
+
+    def record_monitor_info():
+        result = recording['Monitors'] = monitor_info()
+        if _recording():
+            _write_monitors()
+        return result
+
+    return {'get_cursor_pos': record_cursor_pos,
+            'get_mouse_click': record_mouse_click,
+            'get_key_states': record_key_states,
+            'monitor_info': record_monitor_info}
+
+
+def replay_functions(file_name):
+    """Create the input functions to read from a trace file instead of the operating system."""
+    trace = TraceReader(file_name)
+
+    def get_cursor_pos():
+        trace.next_frame()
+        return trace.cursor_pos
+
+    def get_mouse_click():
+        return trace.mouse_click
+
+    def get_key_press(key):
+        return bool(trace.key_states >> key & 1)
+
+    def get_key_states():
+        return trace.key_states
+
+    def get_resolution():
+        try:
+            x0, y0, x1, y1 = trace.monitors[0]
+        except IndexError:
+            raise NotImplementedError('no monitors were recorded in the trace')
+        return (x1 - x0, y1 - y0)
+
+    def get_monitor_locations():
+        if trace.multi_monitor:
+            return list(trace.monitors)
+        return []
+
+    def get_double_click_time():
+        return trace.double_click_time
+
+    return {'get_cursor_pos': get_cursor_pos,
+            'get_mouse_click': get_mouse_click,
+            'get_key_press': get_key_press,
+            'get_key_states': get_key_states,
+            'get_resolution': get_resolution,
+            'get_monitor_locations': get_monitor_locations,
+            'get_double_click_time': get_double_click_time}
@@ -68,6 +68,23 @@ def get_key_press(key):
         True/False if the selected key has been pressed or not.
     """
     return ctypes.windll.user32.GetKeyState(key) > 1
+
+
+#Translation table to convert each byte of the keyboard state to a binary digit
+_KEY_DOWN = b'0' * 128 + b'1' * 128
+
+
+def get_key_states():
+    """Get the state of every key at once.
+    Returns:
+        Integer bitmask, where bit n is set if the key with the code n is pressed.
+    """
+    key_states = (ctypes.c_ubyte * 256)()
+    
+    #Make sure the keyboard state is up to date before reading it
+    ctypes.windll.user32.GetKeyState(0)
+    ctypes.windll.user32.GetKeyboardState(ctypes.byref(key_states))
+    return int(bytes(bytearray(key_states).translate(_KEY_DOWN)[::-1]), 2)
     
 
 class _RECT(ctypes.Structure):
@@ -82,6 +82,20 @@ def get_key_press(key):
     return win32api.GetAsyncKeyState(key)
 
 
+#Translation table to convert each byte of the keyboard state to a binary digit
+_KEY_DOWN = b'0' * 128 + b'1' * 128
+
+
+def get_key_states():
+    """Get the state of every key at once.
+    Returns:
+        Integer bitmask, where bit n is set if the key with the code n is pressed.
+    """
+    win32api.GetKeyState(0)
+    key_states = bytearray(win32api.GetKeyboardState())
+    return int(bytes(key_states.translate(_KEY_DOWN)[::-1]), 2)
+
+
 def get_monitor_locations():
     """Return a list of (x[0], y[0], x[1], y[1]) coordinates for each monitor."""
     return tuple(m[2] for m in win32api.EnumDisplayMonitors())
@@ -0,0 +1,420 @@
+"""
+This is part of the Mouse Tracks Python application.
+Source: https://github.com/Peter92/MouseTracks
+"""
+#Store statistics in arrays instead of nested dicts
+
+from __future__ import absolute_import
+
+from bisect import bisect_right
+
+import core.numpy as numpy
+from core.compatibility import Mapping, get_items
+from core.os import KEYS
+
+
+#Lower edge of each interval bin in ticks, the last bin has no upper limit
+INTERVAL_EDGES = numpy.log_edges(pow(2, 16), 48)
+
+_INTERVAL_EDGE_LIST = [int(i) for i in INTERVAL_EDGES]
+
+#Gamepad axis values go from -32768 (thumbsticks) up to 65535 (triggers)
+AXIS_MIN = -32768
+
+AXIS_BIN_WIDTH = 256
+
+AXIS_BINS = 384
+
+AXIS_EDGES = numpy.linear_edges(AXIS_MIN, AXIS_BIN_WIDTH, AXIS_BINS)
+
+
+class _CountView(Mapping):
+    """Read only dict of the values above 0 in a vector, keyed by name."""
+    def __init__(self, names, ids, values):
+        self._names = names
+        self._ids = ids
+        self._values = values
+
+    def __getitem__(self, name):
+        value = int(self._values[self._ids[name]])
+        if not value:
+            raise KeyError(name)
+        return value
+
+    def __iter__(self):
+        for i in numpy.nonzero(self._values):
+            yield self._names[i]
+
+    def __len__(self):
+        return int(numpy.count(self._values))
+
+
+class _PairView(Mapping):
+    """Read only nested dict of the values above 0 in a matrix, keyed by name."""
+    def __init__(self, names, ids, values):
+        self._names = names
+        self._ids = ids
+        self._values = values
+
+    def __getitem__(self, name):
+        row = self._values[self._ids[name]]
+        if not numpy.count(row):
+            raise KeyError(name)
+        return _CountView(self._names, self._ids, row)
+
+    def __iter__(self):
+        for i in numpy.nonzero(numpy.count(self._values, axis=1)):
+            yield self._names[i]
+
+    def __len__(self):
+        return int(numpy.count(numpy.count(self._values, axis=1)))
+
+
+class _IntervalView(Mapping):
+    """Read only dict of interval histograms, in the old nested format.
+    Each bin is keyed by the lowest number of ticks it contains.
+    """
+    def __init__(self, stats, total, counts):
+        self._stats = stats
+        self._total = total
+        self._counts = counts
+
+    def __getitem__(self, name):
+        if name == 'Total':
+            return _histogram_dict(INTERVAL_EDGES, self._total)
+        elif name == 'Individual':
+            individual = {}
+            for (last_id, key_id), row in get_items(self._stats.interval_pairs):
+                histogram = _histogram_dict(INTERVAL_EDGES, self._counts[row])
+                if histogram:
+                    last_key = self._stats.names[last_id]
+                    individual.setdefault(last_key, {})[self._stats.names[key_id]] = histogram
+            return individual
+        raise KeyError(name)
+
+    def __iter__(self):
+        return iter(('Total', 'Individual'))
+
+    def __len__(self):
+        return 2
+
+
+class _AxisView(Mapping):
+    """Read only dict of axis histograms, in the old nested format.
+    Each bin is keyed by the lowest value it contains.
+    """
+    def __init__(self, names, ids, counts):
+        self._names = names
+        self._ids = ids
+        self._counts = counts
+
+    def __getitem__(self, name):
+        histogram = _histogram_dict(AXIS_EDGES, self._counts[self._ids[name]])
+        if not histogram:
+            raise KeyError(name)
+        return histogram
+
+    def __iter__(self):
+        for i in numpy.nonzero(numpy.count(self._counts, axis=1)):
+            yield self._names[i]
+
+    def __len__(self):
+        return int(numpy.count(numpy.count(self._counts, axis=1)))
+
+
+class KeyStats(object):
+    """Keyboard statistics for a profile.
+
+    Each key name is given an index, and the counts are stored in vectors
+    (or a matrix for mistakes), so recording a key is a single array update.
+    Instead of recording the session separately, the counts are copied
+    at the start of each session, and the session is the difference.
+
+    The time between key presses is stored in log spaced bins (see
+    INTERVAL_EDGES), with a row of bins for each pair of keys used.
+
+    The data can be read as if it was the old nested dicts, such as
+    stats['All']['Pressed']['A'] or stats['Session']['Mistakes']['A']['S'].
+    """
+    def __init__(self, names=None):
+        self.names = []
+        self.ids = {}
+        self.pressed = numpy.array((0,), create=True, dtype='int64')
+        self.held = numpy.array((0,), create=True, dtype='int64')
+        self.mistakes = numpy.array((0, 0), create=True, dtype='int64')
+        self._add_names(sorted(KEYS) if names is None else names)
+        self.clear_intervals()
+        self.start_session()
+
+    def _add_names(self, names):
+        """Add new key names, and resize the arrays to fit them."""
+        names = [name for name in names if name not in self.ids]
+        if not names:
+            return
+        for name in names:
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+
+        size = len(self.names)
+        self.pressed = _resize(self.pressed, (size,))
+        self.held = _resize(self.held, (size,))
+        self.mistakes = _resize(self.mistakes, (size, size))
+        try:
+            baseline = self.baseline
+        except AttributeError:
+            return
+        baseline['Pressed'] = _resize(baseline['Pressed'], (size,))
+        baseline['Held'] = _resize(baseline['Held'], (size,))
+        baseline['Mistakes'] = _resize(baseline['Mistakes'], (size, size))
+
+    def _id(self, name):
+        try:
+            return self.ids[name]
+        except KeyError:
+            self._add_names([name])
+            return self.ids[name]
+
+    def _interval_row(self, last_key, key):
+        """Get the row of interval bins for a pair of keys, adding it if needed."""
+        pair = (self._id(last_key), self._id(key))
+        try:
+            return self.interval_pairs[pair]
+        except KeyError:
+            pass
+        row = self.interval_pairs[pair] = len(self.interval_pairs)
+
+        #Double the number of rows when full, to avoid resizing on every new pair
+        rows = len(self.interval_counts)
+        if row >= rows:
+            shape = ((rows * 2) or 16, len(INTERVAL_EDGES))
+            self.interval_counts = _resize(self.interval_counts, shape)
+            self.baseline['IntervalCounts'] = _resize(self.baseline['IntervalCounts'], shape)
+        return row
+
+    def clear_intervals(self):
+        """Remove all recorded intervals."""
+        self.interval_pairs = {}
+        self.interval_total = _resize(numpy.array((0,), create=True), (len(INTERVAL_EDGES),))
+        self.interval_counts = _resize(numpy.array((0, 0), create=True), (0, len(INTERVAL_EDGES)))
+        try:
+            self.baseline['IntervalTotal'] = self.interval_total.copy()
+            self.baseline['IntervalCounts'] = self.interval_counts.copy()
+        except AttributeError:
+            pass
+
+    def start_session(self):
+        """Use the current counts as the start of a new session."""
+        self.baseline = {'Pressed': self.pressed.copy(),
+                         'Held': self.held.copy(),
+                         'Mistakes': self.mistakes.copy(),
+                         'IntervalTotal': self.interval_total.copy(),
+                         'IntervalCounts': self.interval_counts.copy()}
+
+    def press(self, key):
+        key_id = self._id(key)
+        self.pressed[key_id] += 1
+
+    def hold(self, keys):
+        """Record that a list of keys were held for a tick."""
+        if keys:
+            key_ids = [self._id(key) for key in keys]
+            numpy.add_at(self.held, key_ids, 1)
+
+    def mistake(self, key, correction):
+        """Record a key that was deleted and replaced with another."""
+        key_ids = (self._id(key), self._id(correction))
+        self.mistakes[key_ids] += 1
+
+    def interval(self, last_key, key, ticks, count=1):
+        """Record the number of ticks between two key presses."""
+        interval_bin = _interval_bin(ticks)
+        row = self._interval_row(last_key, key)
+        self.interval_total[interval_bin] += count
+        self.interval_counts[row, interval_bin] += count
+
+    def interval_percentile(self, percentile, last_key=None, key=None, session=False):
+        """Estimate the number of ticks between key presses at a percentile.
+        If both keys are given, only that pair will be used.
+        Returns None if nothing has been recorded.
+        """
+        if last_key is None or key is None:
+            counts = self.interval_total
+            if session:
+                counts = counts - self.baseline['IntervalTotal']
+        else:
+            try:
+                row = self.interval_pairs[(self.ids[last_key], self.ids[key])]
+            except KeyError:
+                return None
+            counts = self.interval_counts[row]
+            if session:
+                counts = counts - self.baseline['IntervalCounts'][row]
+        return numpy.histogram_percentile(INTERVAL_EDGES, counts, percentile)
+
+    def __getitem__(self, name):
+        """Read the data in the format of the old nested dicts."""
+        pressed, held, mistakes = self.pressed, self.held, self.mistakes
+        interval_total, interval_counts = self.interval_total, self.interval_counts
+        if name == 'Session':
+            pressed = pressed - self.baseline['Pressed']
+            held = held - self.baseline['Held']
+            mistakes = mistakes - self.baseline['Mistakes']
+            interval_total = interval_total - self.baseline['IntervalTotal']
+            interval_counts = interval_counts - self.baseline['IntervalCounts']
+        elif name != 'All':
+            raise KeyError(name)
+        return {'Pressed': _CountView(self.names, self.ids, pressed),
+                'Held': _CountView(self.names, self.ids, held),
+                'Mistakes': _PairView(self.names, self.ids, mistakes),
+                'Intervals': _IntervalView(self, interval_total, interval_counts)}
+
+    def load_intervals(self, all_intervals, session_intervals=None):
+        """Add intervals from the old nested dicts.
+        Any counts from the session dicts are treated as part of this session.
+        """
+        for intervals, session in ((all_intervals, False), (session_intervals, True)):
+            if not intervals:
+                continue
+            for ticks, count in get_items(intervals.get('Total', {})):
+                interval_bin = _interval_bin(ticks)
+                if session:
+                    self.baseline['IntervalTotal'][interval_bin] -= count
+                else:
+                    self.interval_total[interval_bin] += count
+                    self.baseline['IntervalTotal'][interval_bin] += count
+            for last_key, keys in get_items(intervals.get('Individual', {})):
+                for key, ticks in get_items(keys):
+                    row = self._interval_row(last_key, key)
+                    for tick, count in get_items(ticks):
+                        interval_bin = _interval_bin(tick)
+                        if session:
+                            self.baseline['IntervalCounts'][row, interval_bin] -= count
+                        else:
+                            self.interval_counts[row, interval_bin] += count
+                            self.baseline['IntervalCounts'][row, interval_bin] += count
+
+    @classmethod
+    def from_dicts(cls, keys):
+        """Convert the old nested dicts of keyboard data."""
+        new = cls()
+        for group in keys.values():
+            new._add_names(group.get('Pressed', {}))
+            new._add_names(group.get('Held', {}))
+            for key, corrections in get_items(group.get('Mistakes', {})):
+                new._add_names([key])
+                new._add_names(corrections)
+
+        def _load(group):
+            pressed = numpy.array((len(new.names),), create=True, dtype='int64')
+            held = numpy.array((len(new.names),), create=True, dtype='int64')
+            mistakes = numpy.array((len(new.names), len(new.names)), create=True, dtype='int64')
+            for key, count in get_items(group.get('Pressed', {})):
+                pressed[new.ids[key]] = count
+            for key, count in get_items(group.get('Held', {})):
+                held[new.ids[key]] = count
+            for key, corrections in get_items(group.get('Mistakes', {})):
+                for correction, count in get_items(corrections):
+                    mistakes[new.ids[key], new.ids[correction]] = count
+            return pressed, held, mistakes
+
+        new.pressed, new.held, new.mistakes = _load(keys['All'])
+        new.start_session()
+        session = keys.get('Session', {})
+        if session:
+            pressed, held, mistakes = _load(session)
+            new.baseline['Pressed'] = new.pressed - pressed
+            new.baseline['Held'] = new.held - held
+            new.baseline['Mistakes'] = new.mistakes - mistakes
+        new.load_intervals(keys['All'].get('Intervals'), session.get('Intervals'))
+        return new
+
+
+def _resize(array, shape):
+    """Pad an array with zeros up to a new shape."""
+    new = numpy.array(shape[::-1], create=True, dtype='int64')
+    new[tuple(slice(0, i) for i in array.shape)] = array
+    return new
+
+
+def _interval_bin(ticks):
+    return bisect_right(_INTERVAL_EDGE_LIST, ticks) - 1
+
+
+def _histogram_dict(edges, counts):
+    """Convert histogram counts to a dict of the bins used."""
+    return {int(edges[i]): int(counts[i]) for i in numpy.nonzero(counts)}
+
+
+class AxisStats(object):
+    """Gamepad axis statistics for a profile.
+
+    Each axis has a fixed number of bins (see AXIS_EDGES), so the memory
+    used doesn't depend on how many different values have been recorded.
+    As with KeyStats, the session is the difference from a copy of the
+    counts taken at the start of the session.
+
+    The data can be read as if it was the old nested dicts, such as
+    stats['All']['l_thumb_x'].
+    """
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+        self.counts = _resize(numpy.array((0, 0), create=True), (0, AXIS_BINS))
+        self.start_session()
+
+    def _id(self, name):
+        try:
+            return self.ids[name]
+        except KeyError:
+            pass
+        self.ids[name] = len(self.names)
+        self.names.append(name)
+        shape = (len(self.names), AXIS_BINS)
+        self.counts = _resize(self.counts, shape)
+        self.baseline = _resize(self.baseline, shape)
+        return self.ids[name]
+
+    def start_session(self):
+        """Use the current counts as the start of a new session."""
+        self.baseline = self.counts.copy()
+
+    def record(self, updates):
+        """Record a list of axis updates, where each update is a dict of values."""
+        axis_ids = []
+        values = []
+        for update in updates:
+            for axis, value in get_items(update):
+                axis_ids.append(self._id(axis))
+                values.append(value)
+        if values:
+            bins = numpy.histogram_index(values, AXIS_MIN, AXIS_BIN_WIDTH, AXIS_BINS)
+            numpy.add_at(self.counts, (axis_ids, bins), 1)
+
+    def __getitem__(self, name):
+        """Read the data in the format of the old nested dicts."""
+        if name == 'All':
+            counts = self.counts
+        elif name == 'Session':
+            counts = self.counts - self.baseline
+        else:
+            raise KeyError(name)
+        return _AxisView(self.names, self.ids, counts)
+
+    @classmethod
+    def from_dicts(cls, axis_all, axis_session=None):
+        """Convert the old nested dicts of axis data."""
+        new = cls()
+        for axes, session in ((axis_all, False), (axis_session, True)):
+            for axis, amounts in get_items(axes or {}):
+                axis_id = new._id(axis)
+                values = list(amounts)
+                if not values:
+                    continue
+                bins = numpy.histogram_index(values, AXIS_MIN, AXIS_BIN_WIDTH, AXIS_BINS)
+                counts = [amounts[value] for value in values]
+                if session:
+                    numpy.add_at(new.baseline, (axis_id, bins), [-count for count in counts])
+                else:
+                    numpy.add_at(new.counts, (axis_id, bins), counts)
+                    numpy.add_at(new.baseline, (axis_id, bins), counts)
+        return new
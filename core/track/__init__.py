@@ -8,39 +8,169 @@ from __future__ import division, absolute_import
 
 import time
 import traceback
+from bisect import bisect_left
 from multiprocessing import Process, Queue
 from threading import Thread
 
-from core.compatibility import get_items, _print
+from core.compatibility import get_items, monotonic, _print, Empty
 from core.config import CONFIG
 from core.constants import UPDATES_PER_SECOND
 from core.error import handle_error
 from core.files import Lock
 from core.messages import time_format
 from core.notify import *
-from core.os import monitor_info, get_cursor_pos, get_mouse_click, get_key_press, KEYS, MULTI_MONITOR, get_double_click_time
+from core.maths import iterate_bits
+from core.os import monitor_info, get_cursor_pos, get_mouse_click, get_key_states, KEYS, KEY_NAMES, KEY_MASK, MULTI_MONITOR, get_double_click_time, REPLAY_SPEED
+from core.os.replay import ReplayFinished
 from core.track.background import background_process, running_processes, monitor_offset
-from core.track.xinput import Gamepad
+from core.track.ringbuffer import EventRingBuffer, encode_frame, SHARED_MEMORY
+from core.track.profiler import create_profiler
+from core.track.timer import Timers
+
+#Gamepads are only supported on Windows
+try:
+    from core.track.xinput import Gamepad
+except (AttributeError, OSError):
+    Gamepad = None
+
+
+class FrameStats(object):
+    """Histograms of how long each frame took, and how late they finished.
+    Each bin counts the values up to its limit (in milliseconds),
+    and the final bin is for anything higher.
+    """
+    BINS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+    
+    def __init__(self):
+        self.reset()
+    
+    def reset(self):
+        self.frame_times = [0] * (len(self.BINS) + 1)
+        self.overruns = [0] * (len(self.BINS) + 1)
+        self.frames = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.overrun_count = 0
+        self.max_overrun = 0.0
+        self.dropped = 0
+        self.started = time.time()
+    
+    def add(self, frame_time, overrun):
+        frame_time *= 1000
+        self.frame_times[bisect_left(self.BINS, frame_time)] += 1
+        self.frames += 1
+        self.total_time += frame_time
+        self.max_time = max(self.max_time, frame_time)
+        if overrun > 0:
+            overrun *= 1000
+            self.overruns[bisect_left(self.BINS, overrun)] += 1
+            self.overrun_count += 1
+            self.max_overrun = max(self.max_overrun, overrun)
+    
+    def mean(self):
+        """Get the average frame time in milliseconds."""
+        if not self.frames:
+            return 0.0
+        return self.total_time / self.frames
+    
+    def _percentile(self, histogram, total, maximum, percent):
+        target = total * percent / 100
+        count = 0
+        for i, amount in enumerate(histogram):
+            count += amount
+            if amount and count >= target:
+                try:
+                    return self.BINS[i]
+                except IndexError:
+                    return maximum
+        return 0
+    
+    def percentile(self, percent):
+        """Get the upper limit of the bin containing a percentile of frame times."""
+        return self._percentile(self.frame_times, self.frames, self.max_time, percent)
+    
+    def overrun_percentile(self, percent):
+        """Get the upper limit of the bin containing a percentile of overruns."""
+        return self._percentile(self.overruns, self.overrun_count, self.max_overrun, percent)
+    
+    def summary(self):
+        """Get the results since the last reset, in the same layout as the stage profiler."""
+        return {'name': 'Frames',
+                'start': self.started,
+                'end': time.time(),
+                'frames': self.frames,
+                'mean_ms': self.mean(),
+                'p99_ms': self.percentile(99),
+                'max_ms': self.max_time,
+                'overruns': self.overrun_count,
+                'overrun_p99_ms': self.overrun_percentile(99),
+                'overrun_max_ms': self.max_overrun,
+                'dropped': self.dropped,
+                'bins_ms': list(self.BINS),
+                'histogram': list(self.frame_times),
+                'overrun_histogram': list(self.overruns)}
 
 
 class RefreshRateLimiter(object):
     """Limit the loop to a fixed updates per second.
-    It works by detecting how long a frame should be,
-    and comparing it to how long it's already taken.
+    Each frame is given a deadline on a monotonic clock, which is moved along
+    by exactly one frame each time, so any errors from sleeping don't add up.
+    If a frame overruns, the next ones start straight away to catch up,
+    but if it falls too far behind then the missed frames are skipped.
+    Set the ticks to 0 to not limit it at all.
     """
-    def __init__(self, ticks):
+    def __init__(self, ticks, max_lag=0.25):
+        self.frame_time = 1 / ticks if ticks else 0
+        self.max_lag = max_lag
+        self.step = 1
+        self.skipped = 0
+        self.stats = FrameStats()
         self.time = time.time()
-        self.frame_time = 1 / ticks
-
+        self.deadline = monotonic()
+        self._reset = False
+    
+    def __call__(self, step=1):
+        """Set how many ticks the next frame should last for."""
+        self.step = step
+        return self
+    
     def __enter__(self):
+        self.time = time.time()
+        self.start = monotonic()
         return self
 
     def __exit__(self, *args):
-        time_difference = time.time() - self.time
+        now = monotonic()
+        self.deadline += self.frame_time * self.step
+        self.skipped = 0
+        
+        #Start again from the current time if the frame was not meant to be counted
+        if self._reset:
+            self._reset = False
+            self.deadline = now
+            return
+        
+        #Run as fast as possible
+        if not self.frame_time:
+            self.deadline = now
+            self.stats.add(now - self.start, 0)
+            return
+        
+        overrun = now - self.deadline
+        self.stats.add(now - self.start, overrun)
+        if overrun > self.max_lag:
+            self.skipped = int(overrun // self.frame_time)
+            self.deadline += self.skipped * self.frame_time
+            self.stats.dropped += self.skipped
+        
         try:
-            time.sleep(max(0, self.frame_time - time_difference))
+            time.sleep(max(0, self.deadline - now))
         except IOError: #Interrupted function call (when quitting program)
             pass
+    
+    def reset(self):
+        """Ignore the time taken by the current frame."""
+        self._reset = True
 
 
 class ThreadHelper(Thread):
@@ -55,6 +185,50 @@ class ThreadHelper(Thread):
         self.function(*self.args, **self.kwargs)
 
         
+def _send_frames(q, frames):
+    """Send any buffered frames to the background process, and empty the list.
+    Multiple frames are grouped into a single batch message.
+    """
+    if not frames:
+        return
+    if len(frames) == 1:
+        q.put(frames[0])
+    else:
+        q.put({'Batch': list(frames)})
+    del frames[:]
+
+
+def _send_ring(q, ring, tick, frame_data):
+    """Write the input events of a frame to the ring buffer.
+    If anything else is in the frame, or the buffer is full, the whole frame
+    goes through the queue instead, marked with the ring position to keep the order.
+    """
+    records, remaining = encode_frame(tick, frame_data)
+    if remaining or not ring.write(records):
+        frame_data['RingPosition'] = ring.head
+        q.put(frame_data)
+
+        
+def _wait_for_process(process, q):
+    """Wait for a process to exit, printing anything it sends in the meantime.
+    The queue needs to be emptied, otherwise the process may not be able to finish.
+    """
+    while process.is_alive() or not q.empty():
+        try:
+            received_message = q.get(timeout=0.1)
+        except Empty:
+            continue
+        try:
+            notify_output = NOTIFY.format_events(received_message['Notify'])
+        except (KeyError, TypeError):
+            if isinstance(received_message, str):
+                _print(received_message)
+        else:
+            if notify_output:
+                _print(u'{} {}'.format(time_format(time.time()), notify_output))
+    process.join()
+
+
 def start_tracking():
     """Put a lock on the main script to stop more than one instance running."""
     
@@ -69,6 +243,9 @@ def _start_tracking():
     
     _background_process = None
     no_detection_wait = 2
+    frame_buffer = []
+    ring = None
+    profiler = create_profiler('Main')
     
     try:
         NOTIFY(MT_PATH)
@@ -80,6 +257,8 @@ def _start_tracking():
                  'Save': CONFIG['Save']['Frequency'] * UPDATES_PER_SECOND,
                  'ReloadProgramList': CONFIG['Advanced']['ReloadApplicationList'],
                  'UpdateQueuedCommands': CONFIG['Advanced']['ShowQueuedCommands'],
+                 'ShowFrameStats': CONFIG['Advanced']['ShowFrameStats'],
+                 'ProfileStages': CONFIG['Advanced']['ProfileStages'],
                  'RefreshGamepads': CONFIG['Advanced']['RefreshGamepads'],
                  'HistoryCheck': CONFIG['Advanced']['HistoryCheck']}
                  
@@ -95,11 +274,12 @@ def _start_tracking():
                            'LastClickTime': 0,
                            'OffScreen': False,
                            'DoubleClickTime': get_double_click_time() / 1000 * UPDATES_PER_SECOND},
-                 'Keyboard': {'KeysPressed': {k: False for k in KEYS.keys()}},
+                 'Keyboard': {'KeysPressed': {k: False for k in KEYS.keys()},
+                              'States': 0},
                  'LastActivity': 0,
                  'LastSent': 0,
-                 'Save': {'Finished': True,
-                          'Next': timer['Save']},
+                 'BufferStart': 0,
+                 'Save': {'Finished': True},
                  'Gamepad': {'ButtonsPressed': {}}
                 }
         mouse_pos = store['Mouse']['Position']
@@ -107,7 +287,10 @@ def _start_tracking():
         #Start background processes
         q_bg_send = Queue()
         q_bg_recv = Queue()
-        _background_process = Process(target=background_process, args=(q_bg_send, q_bg_recv))
+        if CONFIG['Advanced']['SharedMemoryTransport'] and SHARED_MEMORY:
+            ring = EventRingBuffer()
+        ring_name = None if ring is None else ring.name
+        _background_process = Process(target=background_process, args=(q_bg_send, q_bg_recv, ring_name))
         _background_process.daemon = True
         _background_process.start()
         
@@ -118,27 +301,94 @@ def _start_tracking():
         _running_programs.start()
         
         ticks = 0
+        limiter = RefreshRateLimiter(UPDATES_PER_SECOND * REPLAY_SPEED)
+        gamepads = {}
+        
+        #Set up the periodic tasks
+        #Anything that has to happen on the first tick has an offset of 0
+        def _history_check():
+            frame_data['HistoryCheck'] = True
+        
+        def _update_programs():
+            frame_data_rp['Update'] = True
+        
+        def _reload_program_list():
+            frame_data_rp['Reload'] = True
+        
+        def _show_queue_size():
+            if timer['Save'] and store['LastActivity'] > ticks - timer['Save']:
+                try:
+                    NOTIFY(QUEUE_SIZE, q_bg_send.qsize())
+                except NotImplementedError:
+                    pass
+        
+        def _dump_profile():
+            profiler.dump()
+            frame_data['ProfileDump'] = True
+        
+        def _show_frame_stats():
+            stats = limiter.stats
+            if NOTIFY.allowed(FRAME_STATS):
+                NOTIFY(FRAME_STATS, stats.frames, stats.mean(), stats.percentile(99),
+                       stats.max_time, stats.overrun_count, stats.overrun_percentile(99), stats.dropped)
+            stats.reset()
+        
+        timers = Timers()
+        timers.add('UpdateScreen', timer['UpdateScreen'], offset=0)
+        timers.add('RefreshGamepads', timer['RefreshGamepads'], offset=0)
+        timers.add('ReloadProgramList', timer['ReloadProgramList'], _reload_program_list, offset=0)
+        timers.add('UpdatePrograms', timer['UpdatePrograms'], _update_programs)
+        timers.add('HistoryCheck', timer['HistoryCheck'], _history_check)
+        timers.add('UpdateQueuedCommands', timer['UpdateQueuedCommands'], _show_queue_size)
+        timers.add('ShowFrameStats', timer['ShowFrameStats'], _show_frame_stats, offset=timer['ShowFrameStats'])
+        timers.add('Save', timer['Save'], offset=timer['Save'])
+        timers.add('ProfileStages', timer['ProfileStages'], _dump_profile, offset=timer['ProfileStages'])
+        idle_timeout = CONFIG['Advanced']['IdleTimeout']
+        idle_tick_step = max(1, UPDATES_PER_SECOND // CONFIG['Advanced']['IdleUpdatesPerSecond'])
         NOTIFY(START_MAIN)
         _print(u'{} {}'.format(time_format(time.time()), NOTIFY.get_output()))
         while True:
-            with RefreshRateLimiter(UPDATES_PER_SECOND) as limiter:
+        
+            #Lower the update rate if nothing has happened for a while
+            #Each loop then counts as multiple ticks, so the timers and recorded time still match
+            if idle_timeout and ticks - store['LastActivity'] > idle_timeout:
+                tick_step = idle_tick_step
+            else:
+                tick_step = 1
+            
+            with limiter(tick_step):
+                profiler.start()
                 
                 #Send data to thread
                 try:
-                    if frame_data or frame_data_rp:
+                    if frame_data:
                         last_sent = ticks - store['LastSent']
-                        if frame_data:
-                            if last_sent:
-                                frame_data['Ticks'] = last_sent
-                            q_bg_send.put(frame_data)
-                        if frame_data_rp:
-                            q_rp_send.put(frame_data_rp)
+                        if last_sent:
+                            frame_data['Ticks'] = last_sent
+                        if ring is not None:
+                            _send_ring(q_bg_send, ring, ticks, frame_data)
+                        else:
+                            if not frame_buffer:
+                                store['BufferStart'] = limiter.time
+                            frame_buffer.append(frame_data)
                         store['LastSent'] = ticks
+                    if frame_data_rp:
+                        q_rp_send.put(frame_data_rp)
+                        
+                    #Group frames together to cut down on the queue overhead
+                    if frame_buffer and (len(frame_buffer) >= CONFIG['Advanced']['QueueBatchSize']
+                                         or 'Save' in frame_buffer[-1]
+                                         or limiter.time - store['BufferStart'] >= CONFIG['Advanced']['QueueBatchTime'] / 1000):
+                        _send_frames(q_bg_send, frame_buffer)
                 except NameError:
                     pass
                 
                 while not q_rp_recv.empty():
-                    _print(u'{} {}'.format(time_format(limiter.time), q_rp_recv.get()))
+                    notify_output = NOTIFY.format_events(q_rp_recv.get()['Notify'])
+                    if notify_output:
+                        _print(u'{} {}'.format(time_format(limiter.time), notify_output))
+                
+                profiler.mark('Send')
                 
                 #Print any messages from previous loop
                 notify_extra = ''
@@ -154,8 +404,15 @@ def _start_tracking():
                             handle_error(received_message)
                     except AttributeError:
                         pass
+                    
+                    #Receive notifications
+                    try:
+                        notify_output = NOTIFY.format_events(received_message['Notify'])
+                    except (KeyError, TypeError):
+                        pass
                     else:
-                        received_data.append(received_message)
+                        if notify_output:
+                            received_data.append(notify_output)
                     
                     #Get notification when saving is finished
                     try:
@@ -164,7 +421,15 @@ def _start_tracking():
                         pass
                     else:
                         store['Save']['Finished'] = True
-                        store['Save']['Next'] = ticks + timer['Save']
+                        timers.reset('Save', ticks)
+                    
+                    #Reply to requests for the frame stats
+                    try:
+                        received_message.pop('FrameStats')
+                    except (KeyError, AttributeError):
+                        pass
+                    else:
+                        q_bg_send.put({'FrameStats': limiter.stats.summary()})
                     
                 if received_data:
                     notify_extra = u' | '.join(received_data)
@@ -178,10 +443,11 @@ def _start_tracking():
                 if notify_output:
                     _print(u'{} {}'.format(time_format(limiter.time), notify_output))
 
+                profiler.mark('Notify')
+
                 frame_data = {}
                 frame_data_rp = {}
                 
-                
                 #Mouse Movement
                 mouse_pos['Current'] = get_cursor_pos()
                 
@@ -191,6 +457,7 @@ def _start_tracking():
                         NOTIFY(MOUSE_UNDETECTED)
                         store['Mouse']['Inactive'] = True
                     time.sleep(no_detection_wait)
+                    limiter.reset()
                     continue
 
                 #Check if mouse left the monitor
@@ -208,6 +475,11 @@ def _start_tracking():
                 if store['Mouse']['Inactive']:
                     store['Mouse']['Inactive'] = False
                     NOTIFY(MOUSE_DETECTED)
+                
+                #Only run the tasks once the frame won't be skipped, or they'd be lost
+                profiler.mark('Cursor')
+                due_tasks = timers.due(ticks)
+                profiler.mark('Tasks')
 
                 #Check if mouse is in a duplicate position
                 if mouse_pos['Current'] is None or mouse_pos['Current'] == mouse_pos['Previous']:
@@ -217,10 +489,13 @@ def _start_tracking():
                 if not store['Mouse']['NotMoved']:
                     if not store['Mouse']['OffScreen']:
                         frame_data['MouseMove'] = (mouse_pos['Previous'], mouse_pos['Current'])
-                        NOTIFY(MOUSE_POSITION, mouse_pos['Current'])
+                        if NOTIFY.allowed(MOUSE_POSITION):
+                            NOTIFY(MOUSE_POSITION, mouse_pos['Current'])
                         store['LastActivity'] = ticks
 
                         
+                profiler.mark('Mouse')
+                
                 #Mouse clicks
                 click_repeat = CONFIG['Advanced']['RepeatClicks']
                 for mouse_button, clicked in enumerate(get_mouse_click()):
@@ -288,36 +563,31 @@ def _start_tracking():
                         store['LastActivity'] = ticks
      
      
+                profiler.mark('Clicks')
+                
                 #Key presses
-                keys_pressed = []
-                keys_held = []
                 key_status = store['Keyboard']['KeysPressed']
                 key_press_repeat = CONFIG['Advanced']['RepeatKeyPress']
+                key_states = get_key_states() & KEY_MASK
+                key_changes = key_states ^ store['Keyboard']['States']
+                store['Keyboard']['States'] = key_states
+                
+                keys_held = [KEY_NAMES[code] for code in iterate_bits(key_states)]
+                _keys_pressed = [KEY_NAMES[code] for code in iterate_bits(key_states & key_changes)]
+                _keys_released = [KEY_NAMES[code] for code in iterate_bits(key_changes & ~key_states)]
+                for k in _keys_pressed:
+                    key_status[k] = ticks
+                for k in _keys_released:
+                    key_status[k] = False
+                
+                #Repeat the press if the key has been held down long enough
                 _keys_held = []
-                _keys_pressed = []
-                _keys_released = []
-                for k in KEYS:
-                    if get_key_press(KEYS[k]):
-                        keys_held.append(k)
-                        
-                        #If key is currently being held down
-                        if key_status[k]:
-                            if key_press_repeat and key_status[k] < ticks - key_press_repeat:
-                                keys_pressed.append(k)
-                                _keys_held.append(k)
-                                key_status[k] = ticks
-
-                        #If key has been pressed
-                        else:
-                            keys_pressed.append(k)
-                            _keys_pressed.append(k)
+                if key_press_repeat:
+                    for k in keys_held:
+                        if key_status[k] < ticks - key_press_repeat:
+                            _keys_held.append(k)
                             key_status[k] = ticks
-                            notify_key_press = list(keys_pressed)
-
-                    #If key has been released
-                    elif key_status[k]:
-                        key_status[k] = False
-                        _keys_released.append(k)
+                keys_pressed = _keys_pressed + _keys_held
                         
                 if keys_pressed:
                     frame_data['KeyPress'] = keys_pressed
@@ -327,23 +597,25 @@ def _start_tracking():
                     frame_data['KeyHeld'] = keys_held
                     store['LastActivity'] = ticks
                     
-                if _keys_pressed:
+                if _keys_pressed and NOTIFY.allowed(KEYBOARD_PRESSES):
                     NOTIFY(KEYBOARD_PRESSES, *_keys_pressed)
                     
-                if _keys_held:
+                if _keys_held and NOTIFY.allowed(KEYBOARD_PRESSES_HELD):
                     NOTIFY(KEYBOARD_PRESSES_HELD, *_keys_held)
                     
-                if _keys_released:
+                if _keys_released and NOTIFY.allowed(KEYBOARD_RELEASED):
                     NOTIFY(KEYBOARD_RELEASED, *_keys_released)
                 
                 
+                profiler.mark('Keys')
+                
                 #Reload list of gamepads (in case one was plugged in)
-                if timer['RefreshGamepads'] and not ticks % timer['RefreshGamepads']:
-                    try:
-                        old_gamepads = set(gamepads)
-                    except UnboundLocalError:
-                        old_gamepads = set()
-                    gamepads = {gamepad.device_number: gamepad for gamepad in Gamepad.list_gamepads()}
+                if 'RefreshGamepads' in due_tasks:
+                    old_gamepads = set(gamepads)
+                    if Gamepad is None:
+                        gamepads = {}
+                    else:
+                        gamepads = {gamepad.device_number: gamepad for gamepad in Gamepad.list_gamepads()}
                     difference = set(gamepads) - old_gamepads
                     for i, id in enumerate(difference):
                         NOTIFY(GAMEPAD_FOUND, id)
@@ -387,8 +659,9 @@ def _start_tracking():
                                 frame_data['GamepadAxis'].append(axis_updates)
                             except KeyError:
                                 frame_data['GamepadAxis'] = [axis_updates]
-                            for axis, value in get_items(printable):
-                                NOTIFY(GAMEPAD_AXIS, id, axis, value)
+                            if NOTIFY.allowed(GAMEPAD_AXIS):
+                                for axis, value in get_items(printable):
+                                    NOTIFY(GAMEPAD_AXIS, id, axis, value)
                             
                         #Button events
                         button_presses = gamepad_input.get_button()
@@ -449,9 +722,11 @@ def _start_tracking():
                         NOTIFY(GAMEPAD_BUTTON_RELEASED, id, buttons)
                 
                 
+                profiler.mark('Gamepad')
+                
                 #Resolution
                 recalculate_mouse = False
-                check_resolution = timer['UpdateScreen'] and not ticks % timer['UpdateScreen']
+                check_resolution = 'UpdateScreen' in due_tasks
                 
                 #Check if resolution has changed
                 if check_resolution:
@@ -508,28 +783,10 @@ def _start_tracking():
                                 store['Resolution']['Previous'] = current_screen_resolution
                 
                 
-                #Send request to check history list
-                if timer['HistoryCheck'] and not ticks % timer['HistoryCheck']:
-                    frame_data['HistoryCheck'] = True
-                            
-                #Send request to update programs
-                if timer['UpdatePrograms'] and not ticks % timer['UpdatePrograms']:
-                    frame_data_rp['Update'] = True
-                
-                #Send request to reload program list
-                if timer['ReloadProgramList'] and not ticks % timer['ReloadProgramList']:
-                    frame_data_rp['Reload'] = True
-
-                #Update user about the queue size
-                if (timer['UpdateQueuedCommands'] and not ticks % timer['UpdateQueuedCommands'] 
-                        and timer['Save'] and store['LastActivity'] > ticks - timer['Save']):
-                    try:
-                        NOTIFY(QUEUE_SIZE, q_bg_send.qsize())
-                    except NotImplementedError:
-                        pass
+                profiler.mark('Resolution')
                 
                 #Send save request
-                if store['Save']['Finished'] and ticks and not ticks % store['Save']['Next']:
+                if 'Save' in due_tasks and store['Save']['Finished']:
                     frame_data['Save'] = True
                     store['Save']['Finished'] = False
 
@@ -537,22 +794,48 @@ def _start_tracking():
                     mouse_pos['Previous'] = None
                 else:
                     mouse_pos['Previous'] = mouse_pos['Current']
-                ticks += 1
+                ticks += tick_step
+            
+            #Count any frames that were dropped from falling behind
+            ticks += limiter.skipped
             
     except Exception as e:
         if _background_process is not None:
             try:
+                _send_frames(q_bg_send, frame_buffer)
                 q_bg_send.put({'Quit': True})
             except IOError:
                 pass
+        if ring is not None:
+            ring.close(unlink=True)
         handle_error(traceback.format_exc())
         
+    #Let the background process finish everything in the queue and save before exiting
+    except ReplayFinished:
+        if _background_process is not None:
+            _send_frames(q_bg_send, frame_buffer)
+            quit_data = {'Quit': True}
+            if ticks > store['LastSent']:
+                quit_data['Ticks'] = ticks - store['LastSent']
+            q_bg_send.put(quit_data)
+            q_rp_send.put({'Quit': True})
+            _wait_for_process(_background_process, q_bg_recv)
+        if ring is not None:
+            ring.close(unlink=True)
+        profiler.dump()
+        NOTIFY(PROCESS_EXIT)
+        _print(u'{} {}'.format(time_format(time.time()), NOTIFY.get_output()))
+        
     except KeyboardInterrupt:
         if _background_process is not None:
             try:
+                _send_frames(q_bg_send, frame_buffer)
                 q_bg_send.put({'Quit': True})
             except IOError:
                 pass
+        if ring is not None:
+            ring.close(unlink=True)
+        profiler.dump()
         NOTIFY(THREAD_EXIT)
         NOTIFY(PROCESS_EXIT)
         _print(u'{} {}'.format(time_format(time.time()), NOTIFY.get_output()))
@@ -11,13 +11,17 @@ import traceback
 
 import core.numpy as numpy
 from core.applications import RunningApplications
-from core.compatibility import range, get_items
+from core.compatibility import range, Empty
 from core.config import CONFIG
-from core.constants import MAX_INT, DISABLE_TRACKING, IGNORE_TRACKING, UPDATES_PER_SECOND
+from core.constants import DISABLE_TRACKING, IGNORE_TRACKING, UPDATES_PER_SECOND
 from core.files import LoadData, save_data, prepare_file
-from core.maths import calculate_line, find_distance
+from core.maths import find_distance
 from core.notify import *
 from core.os import MULTI_MONITOR, monitor_info
+from core.track.monitors import MonitorIndex
+from core.track.profiles import ProfileCache, ProfileWriter
+from core.track.profiler import create_profiler, write_summary
+from core.track.ringbuffer import EventRingBuffer, decode_frames
     
 
 def running_processes(q_recv, q_send, background_send):
@@ -34,6 +38,9 @@ def running_processes(q_recv, q_send, background_send):
         while True:
                 
             received_data = q_recv.get()
+            
+            if 'Quit' in received_data:
+                return
 
             if 'Reload' in received_data:
                 try:
@@ -144,6 +151,49 @@ def _save_wrapper(q_send, program_name, data, new_program=False):
         NOTIFY(SAVE_FAIL_END)
 
 
+def _save_snapshot(program_name, data, tag, members):
+    """Save a snapshot of a profile.
+    This is run in a separate thread, so nothing is sent to NOTIFY.
+    Returns None if the profile isn't meant to be saved.
+    """
+    if program_name is not None and program_name[0] == DISABLE_TRACKING:
+        return None
+    
+    if tag == 'Switch':
+        max_attempts = CONFIG['Save']['MaximumAttemptsSwitch']
+    else:
+        max_attempts = CONFIG['Save']['MaximumAttemptsNormal']
+    
+    compressed_data = prepare_file(data, members=members)
+    for i in range(max_attempts):
+        if save_data(program_name, compressed_data, _compress=False):
+            return True
+        if i + 1 < max_attempts:
+            time.sleep(CONFIG['Save']['WaitAfterFail'])
+    return False
+
+
+def _report_saves(store, q_send):
+    """Send the results of any saves that finished in the background."""
+    for program_name, tag, saved, error in store['Writer'].finished():
+        if error is not None:
+            q_send.put(error)
+        elif tag == 'Save':
+            if saved:
+                NOTIFY(SAVE_SUCCESS)
+            elif saved is not None:
+                NOTIFY(SAVE_FAIL_END)
+        elif saved:
+            NOTIFY(SAVE_BACKGROUND_SUCCESS, program_name)
+        elif saved is not None:
+            NOTIFY(SAVE_BACKGROUND_FAIL, program_name)
+        
+        #Let the main thread know it can request another save
+        if tag == 'Save':
+            q_send.put({'SaveFinished': None})
+    NOTIFY.send(q_send)
+
+
 def monitor_offset(coordinate, monitor_limits):
     """Detect which monitor the mouse is currently over."""
     if coordinate is None:
@@ -162,20 +212,19 @@ def check_resolution(data, resolution):
         raise ValueError('incorrect resolution: {}'.format(resolution))
         
     if resolution not in data['Resolution']:
-        data['Resolution'][resolution] = {'Tracks': numpy.array(resolution, create=True), 'Clicks': {}}
+        data['Resolution'][resolution] = {'Tracks': numpy.array(resolution, create=True, tiled=True), 'Clicks': {}}
         clicks = data['Resolution'][resolution]['Clicks']
-        clicks['All'] = {'Single': {'Left': numpy.array(resolution, create=True),
-                                    'Middle': numpy.array(resolution, create=True),
-                                    'Right': numpy.array(resolution, create=True)},
-                         'Double': {'Left': numpy.array(resolution, create=True),
-                                    'Middle': numpy.array(resolution, create=True),
-                                    'Right': numpy.array(resolution, create=True)}}
-        clicks['Session'] = {'Single': {'Left': numpy.array(resolution, create=True),
-                                        'Middle': numpy.array(resolution, create=True),
-                                        'Right': numpy.array(resolution, create=True)},
-                             'Double': {'Left': numpy.array(resolution, create=True),
-                                        'Middle': numpy.array(resolution, create=True),
-                                        'Right': numpy.array(resolution, create=True)}}
+        clicks['All'] = {'Single': numpy.LazyArrays(resolution), 'Double': numpy.LazyArrays(resolution)}
+
+def _monitor_index(store):
+    """Get the monitor index, rebuilding it if the monitors have changed."""
+    if store['MonitorLimits'] is None:
+        store['MonitorLimits'] = monitor_info()
+    index = store['MonitorIndex']
+    if index is None or index.monitors != [tuple(monitor) for monitor in store['MonitorLimits']]:
+        index = store['MonitorIndex'] = MonitorIndex(store['MonitorLimits'])
+    return index
+
 
 def get_monitor_coordinate(x, y, store):
     """Find the resolution of the monitor and adjusted x, y coordinates."""
@@ -189,18 +238,19 @@ def get_monitor_coordinate(x, y, store):
         return ((x - x_offset, y - y_offset), resolution)
             
     elif MULTI_MONITOR:
-    
-        try:
-            resolution, (x_offset, y_offset) = monitor_offset((x, y), store['MonitorLimits'])
-        except TypeError:
+        
+        #Reload the monitors if the coordinate isn't on any of them
+        monitor = _monitor_index(store).find(x, y)
+        if monitor is None:
             store['MonitorLimits'] = monitor_info()
-            try:
-                resolution, (x_offset, y_offset) = monitor_offset((x, y), store['MonitorLimits'])
-            except TypeError:
+            monitor = _monitor_index(store).find(x, y)
+            if monitor is None:
                 return None
         
+        x1, y1, x2, y2 = store['MonitorIndex'].monitors[monitor]
+        resolution = (x2 - x1, y2 - y1)
         check_resolution(store['Data'], resolution)
-        return ((x - x_offset, y - y_offset), resolution)
+        return ((x - x1, y - y1), resolution)
         
     else:
         resolution = store['Resolution']
@@ -208,36 +258,393 @@ def get_monitor_coordinate(x, y, store):
         return ((x, y), resolution)
             
 
-def _record_keypress(key_dict, *args):
-    """Quick way of recording keypresses that doesn't involve a million try/excepts."""
+def get_monitor_coordinates(x, y, store):
+    """Find the resolution and adjusted coordinates for arrays of x, y values.
+    Any coordinates that don't land on a monitor are dropped.
+    
+    Yields:
+        Resolution, the boolean mask used on the input, and the adjusted (x, y) arrays.
+    """
+    if store['ApplicationResolution'] is not None:
+        monitor_limits = [store['ApplicationResolution'][0]]
+        
+    elif MULTI_MONITOR:
+    
+        #Lines that cross between monitors get split up here
+        for (x1, y1, x2, y2), selection, coordinates in _monitor_index(store).split(x, y):
+            resolution = (x2 - x1, y2 - y1)
+            check_resolution(store['Data'], resolution)
+            yield resolution, selection, coordinates
+        return
+        
+    elif store['Resolution'] is not None:
+        monitor_limits = [(0, 0, store['Resolution'][0], store['Resolution'][1])]
+    
+    else:
+        return
+    
+    for x1, y1, x2, y2 in monitor_limits:
+        selection = (x >= x1) & (x < x2) & (y >= y1) & (y < y2)
+        if selection.any():
+            resolution = (x2 - x1, y2 - y1)
+            check_resolution(store['Data'], resolution)
+            yield resolution, selection, (x[selection] - x1, y[selection] - y1)
+            
+
+#Rebase the track values before they need more than 32 bits
+_TRACK_REBASE_LIMIT = pow(2, 32) - 1
+
+#How many track tiles to update after each batch of frames, when compressing or rebasing
+_REFRESH_TILES = 64
+
+#Anything that changes where mouse movements are written to
+_FRAME_BARRIERS = ('Program', 'ApplicationResolution', 'Resolution', 'MonitorLimits', 'Save', 'Quit', 'Exit')
+
 
-    all = key_dict['All']
-    session = key_dict['Session']
+def _record_pending_moves(store):
+    """Calculate every queued mouse movement and write them to the track maps.
+    When multiple lines cross the same pixel, the most recent one is kept.
+    """
+    if not store['PendingMoves']:
+        return
+    starts, ends, values = zip(*store['PendingMoves'])
+    store['PendingMoves'] = []
     
-    for i in args[:-1]:
-        try:
-            all[i]
-        except KeyError:
-            all[i] = {}
-        all = all[i]
-        try:
-            session[i]
-        except KeyError:
-            session[i] = {}
-        session = session[i]
+    x, y, lines = numpy.calculate_lines(starts, ends, index=True)
+    values = numpy.array(values, dtype='int64')[lines]
+    
+    #Write the pixels to each resolution in one go
+    for resolution, selection, (x, y) in get_monitor_coordinates(x, y, store):
+        latest = numpy.last_unique(y * resolution[0] + x)
+        store['Data']['Resolution'][resolution]['Tracks'][y[latest], x[latest]] = values[selection][latest]
+    store['Profiler'].mark('RecordMoves')
+
+
+def _compress_tracks(store, amount):
+    """Divide the track values and tick counts by an amount.
+    The maps only queue the change, and the tiles are updated over
+    the next few frames by _refresh_tracks.
+    """
+    NOTIFY(TRACK_COMPRESS_START, 'track')
+    _record_pending_moves(store)
     
+    ticks = store['Data']['Ticks']
+    for values in store['Data']['Resolution'].values():
+        values['Tracks'].compress(amount)
+    ticks['Tracks'] = int(ticks['Tracks'] // amount)
+    ticks['Session']['Tracks'] = int(ticks['Session']['Tracks'] // amount)
+    NOTIFY(TRACK_COMPRESS_END, 'track')
+
+
+def _refresh_tracks(store):
+    """Update a limited number of tiles that have queued changes."""
+    remaining = _REFRESH_TILES
+    for values in store['Data']['Resolution'].values():
+        if values['Tracks'].stale:
+            remaining -= values['Tracks'].refresh(remaining)
+            if not remaining:
+                break
+
+
+def _rebase_tracks(store):
+    """Move the track values down by half the current tick count.
+    The order of everything is kept, and only the very oldest values
+    end up being merged together at 1.
+    """
+    _record_pending_moves(store)
+    
+    ticks = store['Data']['Ticks']
+    offset = ticks['Tracks'] // 2
+    for values in store['Data']['Resolution'].values():
+        values['Tracks'].rebase(offset)
+    ticks['Tracks'] -= offset
+    ticks['Session']['Tracks'] = max(0, ticks['Session']['Tracks'] - offset)
+
+
+def _process_frame(store, received_data, q_recv, q_send):
+    """Handle a single frame of data from the main thread.
+    Returns True if the process should exit.
+    """
+    profiler = store['Profiler']
+    
+    #Write any queued mouse movements before the data or resolution changes
+    for key in _FRAME_BARRIERS:
+        if key in received_data:
+            _record_pending_moves(store)
+            break
+    
+    #Increment the amount of time the script has been running for
+    if 'Ticks' in received_data:
+        store['Data']['Ticks']['Total'] += received_data['Ticks']
+    
+    #Save the data
+    if 'Save' in received_data:
+        #Take a snapshot of the data, and write it in the background
+        if store['ActivitySinceLastSave']:
+            NOTIFY(SAVE_START)
+            store['Writer'].write(store['LastProgram'], store['Data'], 'Save')
+            store['ActivitySinceLastSave'] = False
+            store['SavesSkipped'] = 0
+            
+            try:
+                NOTIFY(QUEUE_SIZE, q_recv.qsize())
+            except NotImplementedError:
+                pass
+        else:
+            store['SavesSkipped'] += 1
+            
+            try:
+                NOTIFY(SAVE_SKIP, CONFIG['Save']['Frequency'] * store['SavesSkipped'], q_recv.qsize())
+            except NotImplementedError:
+                pass
+            q_send.put({'SaveFinished': None})
+        profiler.mark('Save')
+    
+    update_resolution = False
+    
+    #Check for new program loaded
+    if 'Program' in received_data:
+        current_program = received_data['Program']
+        
+        if current_program != store['LastProgram']:
+            update_resolution = True
+            
+            if current_program is None:
+                NOTIFY(APPLICATION_LOADING)
+            else:
+                NOTIFY(APPLICATION_LOADING, current_program)
+            NOTIFY.send(q_send)
+            
+            #Keep the old profile loaded, and save it in the background
+            store['Profiles'].add(store['LastProgram'], store['Data'], store['ActivitySinceLastSave'])
+            
+            #Load new profile
+            store['LastProgram'] = current_program
+            cached_data = store['Profiles'].get(current_program)
+            if cached_data is None:
+                store['Data'] = LoadData(current_program)
+            else:
+                store['Data'] = cached_data
+            store['ActivitySinceLastSave'] = False
+            
+            #Check new resolution
+            try:
+                store['ApplicationResolution'] = received_data['ApplicationResolution']
+            except AttributeError:
+                pass
+            if store['ApplicationResolution'] is None:
+                check_resolution(store['Data'], store['Resolution'])
+            else:
+                check_resolution(store['Data'], store['ApplicationResolution'][1])
+                
+            if cached_data is not None:
+                NOTIFY(DATA_CACHED)
+            elif store['Data']['Ticks']['Total']:
+                NOTIFY(DATA_LOADED)
+            else:
+                NOTIFY(DATA_NOTFOUND)
+            
+            try:
+                NOTIFY(QUEUE_SIZE, q_recv.qsize())
+            except NotImplementedError:
+                pass
+                
+        NOTIFY.send(q_send)
+        profiler.mark('Program')
+    
+    if 'ApplicationResolution' in received_data:
+        store['ApplicationResolution'] = received_data['ApplicationResolution']
+        if store['ApplicationResolution'] is not None:
+            check_resolution(store['Data'], store['ApplicationResolution'][1])
+            update_resolution = True
+
+    if 'Resolution' in received_data:
+        store['Resolution'] = received_data['Resolution']
+        check_resolution(store['Data'], received_data['Resolution'])
+        update_resolution = True
+    
+    if 'MonitorLimits' in received_data:
+        store['MonitorLimits'] = received_data['MonitorLimits']
+        update_resolution = True
+    
+    #Keep the history tracking the correct resolution
+    if update_resolution and CONFIG['Main']['HistoryLength']:
+        if store['ApplicationResolution'] is not None:
+            history_resolution = store['ApplicationResolution']
+        elif MULTI_MONITOR:
+            history_resolution = store['MonitorLimits']
+        else:
+            history_resolution = store['Resolution']
+        store['Data']['HistoryAnimation']['Tracks'].set_resolution(history_resolution)
+    if update_resolution:
+        profiler.mark('Resolution')
+    
+    #Record key presses
+    if 'KeyPress' in received_data:
+        store['ActivitySinceLastSave'] = True
+        
+        for key in received_data['KeyPress']:
+        
+            store['Data']['Keys'].press(key)
+            
+            #Record mistakes
+            #Only records the key if a single backspace is used
+            if key == 'BACK':
+                last = store['KeyTrack']['LastKey']
+                if last is not None and last != 'BACK':
+                    store['KeyTrack']['Backspace'] = last
+                else:
+                    store['KeyTrack']['Backspace'] = False
+            elif store['KeyTrack']['Backspace']:
+                store['Data']['Keys'].mistake(store['KeyTrack']['Backspace'], key)
+                store['KeyTrack']['Backspace'] = False
+            
+            #Record interval between key presses
+            if store['KeyTrack']['Time'] is not None:
+                time_difference = store['Data']['Ticks']['Total'] - store['KeyTrack']['Time']
+                store['Data']['Keys'].interval(store['KeyTrack']['LastKey'], key, time_difference)
+            
+            store['KeyTrack']['LastKey'] = key
+            store['KeyTrack']['Time'] = store['Data']['Ticks']['Total']
+        profiler.mark('KeyPress')
+    
+    #Record time keys are held down
+    if 'KeyHeld' in received_data:
+        store['ActivitySinceLastSave'] = True
+        
+        store['Data']['Keys'].hold(received_data['KeyHeld'])
+        profiler.mark('KeyHeld')
+    
+    #Record button presses
     try:
-        all[args[-1]] += 1
+        pressed_buttons = received_data['GamepadButtonPress']
     except KeyError:
-        all[args[-1]] = 1
+        pass
+    else:
+        store['ActivitySinceLastSave'] = True
+        for button_id in pressed_buttons:
+            try:
+                store['Data']['Gamepad']['All']['Buttons']['Pressed'][button_id] += 1
+            except KeyError:
+                store['Data']['Gamepad']['All']['Buttons']['Pressed'][button_id] = 1
+            try:
+                store['Data']['Gamepad']['Session']['Buttons']['Pressed'][button_id] += 1
+            except KeyError:
+                store['Data']['Gamepad']['Session']['Buttons']['Pressed'][button_id] = 1
+        profiler.mark('GamepadButtonPress')
+    
+    #Record how long buttons are held
     try:
-        session[args[-1]] += 1
+       held_buttons = received_data['GamepadButtonHeld']
     except KeyError:
-        session[args[-1]] = 1
+        pass
+    else:
+        store['ActivitySinceLastSave'] = True
+        for button_id in held_buttons:
+            try:
+                store['Data']['Gamepad']['All']['Buttons']['Held'][button_id] += 1
+            except KeyError:
+                store['Data']['Gamepad']['All']['Buttons']['Held'][button_id] = 1
+            try:
+                store['Data']['Gamepad']['Session']['Buttons']['Held'][button_id] += 1
+            except KeyError:
+                store['Data']['Gamepad']['Session']['Buttons']['Held'][button_id] = 1
+        profiler.mark('GamepadButtonHeld')
+                
+    #Axis updates
+    try:
+        axis_updates = received_data['GamepadAxis']
+    except KeyError:
+        pass
+    else:
+        store['Data']['Gamepad']['Axis'].record(axis_updates)
+        profiler.mark('GamepadAxis')
+                        
+    
+    #Calculate and track mouse movement
+    if 'MouseMove' in received_data:
+        store['ActivitySinceLastSave'] = True
+        
+        start, end = received_data['MouseMove']
+        #distance = find_distance(end, start)
+        
+        if CONFIG['Main']['HistoryLength']:
+            store['Data']['HistoryAnimation']['Tracks'].append(end)
+        
+        #Queue the line to be calculated with any others in the same batch
+        if start is None:
+            start = end
+        store['PendingMoves'].append((start, end, store['Data']['Ticks']['Tracks']))
+        
+        store['Data']['Ticks']['Tracks'] += 1
+        
+        #Compress tracks if the count gets too high
+        max_track_value = CONFIG['Advanced']['CompressTrackMax']
+        if max_track_value and store['Data']['Ticks']['Tracks'] > max_track_value:
+            _compress_tracks(store, CONFIG['Advanced']['CompressTrackAmount'])
+        
+        #Keep the track maps within uint32
+        if store['Data']['Ticks']['Tracks'] >= _TRACK_REBASE_LIMIT:
+            _rebase_tracks(store)
+        profiler.mark('MouseMove')
+        
+    #Record mouse clicks
+    if 'MouseClick' in received_data:
+        store['ActivitySinceLastSave'] = True
+        
+        for mouse_button_index, (x, y) in received_data['MouseClick']:
+            
+            try:
+                (x, y), resolution = get_monitor_coordinate(x, y, store)
+            except TypeError:
+                continue
+            
+            mouse_button = ['Left', 'Middle', 'Right'][mouse_button_index]
+            
+            store['Data']['Resolution'][resolution]['Clicks']['All']['Single'].create(mouse_button)[y, x] += 1
+        profiler.mark('MouseClick')
             
+    #Record double clicks
+    if 'DoubleClick' in received_data:
+        store['ActivitySinceLastSave'] = True
+        
+        for mouse_button_index, (x, y) in received_data['DoubleClick']:
+                                    
+            try:
+                (x, y), resolution = get_monitor_coordinate(x, y, store)
+            except TypeError:
+                continue
             
-def background_process(q_recv, q_send):
-    """Function to handle all the data from the main thread."""
+            mouse_button = ['Left', 'Middle', 'Right'][mouse_button_index]
+            store['Data']['Resolution'][resolution]['Clicks']['All']['Double'].create(mouse_button)[y, x] += 1
+        profiler.mark('DoubleClick')
+    
+    
+    #Trim the history list if too long
+    if 'HistoryCheck' in received_data and CONFIG['Main']['HistoryLength']:
+        max_length = CONFIG['Main']['HistoryLength'] * UPDATES_PER_SECOND
+        store['Data']['HistoryAnimation']['Tracks'].trim(max_length)
+        profiler.mark('HistoryCheck')
+    
+    #Write the profiling results when requested by the main thread
+    #The frame stats are requested at the same time, and written when the reply arrives
+    if 'ProfileDump' in received_data:
+        profiler.dump()
+        q_send.put({'FrameStats': None})
+    
+    if received_data.get('FrameStats') is not None:
+        write_summary(received_data['FrameStats'])
+
+    store['Data']['Ticks']['Recorded'] += 1
+    
+    return 'Quit' in received_data or 'Exit' in received_data
+
+
+def background_process(q_recv, q_send, ring_name=None):
+    """Function to handle all the data from the main thread.
+    If the name of a shared memory ring buffer is given, input events will be read from that too.
+    """
+    ring = None
     try:
         NOTIFY(START_THREAD)
         NOTIFY.send(q_send)
@@ -246,6 +653,7 @@ def background_process(q_recv, q_send):
                  'LastProgram': None,
                  'Resolution': None,
                  'MonitorLimits': None,
+                 'MonitorIndex': None,
                  'Offset': (0, 0),
                  'LastResolution': None,
                  'ActivitySinceLastSave': False,
@@ -255,8 +663,14 @@ def background_process(q_recv, q_send):
                  'KeyTrack': {'LastKey': None,
                               'Time': None,
                               'Backspace': False},
-                 'FirstLoad': True
+                 'FirstLoad': True,
+                 'PendingMoves': [],
+                 'Writer': ProfileWriter(_save_snapshot, CONFIG['Advanced']['ProfileCacheSize'] + 1),
+                 'Profiler': create_profiler('Background')
                 }
+        store['Profiles'] = ProfileCache(store['Writer'], CONFIG['Advanced']['ProfileCacheSize'],
+                                         CONFIG['Advanced']['ProfileCacheMemory'] * 1024 * 1024)
+        profiler = store['Profiler']
         
         NOTIFY(DATA_LOADED)
         try:
@@ -265,343 +679,54 @@ def background_process(q_recv, q_send):
             pass
         NOTIFY.send(q_send)
         
+        #Poll the queue instead of waiting forever, as finished saves
+        #and the ring buffer have no way to wake up the process
+        if ring_name is not None:
+            ring = EventRingBuffer(ring_name)
+        poll_time = max(CONFIG['Advanced']['QueueBatchTime'] / 1000, 1 / UPDATES_PER_SECOND)
+        
         while True:
-            received_data = q_recv.get()
-            
-            #Increment the amount of time the script has been running for
-            if 'Ticks' in received_data:
-                store['Data']['Ticks']['Total'] += received_data['Ticks']
-            
-            #Save the data
-            if 'Save' in received_data:
-                if store['ActivitySinceLastSave']:
-                    _save_wrapper(q_send, store['LastProgram'], store['Data'], False)
-                    store['ActivitySinceLastSave'] = False
-                    store['SavesSkipped'] = 0
-                    
-                    try:
-                        NOTIFY(QUEUE_SIZE, q_recv.qsize())
-                    except NotImplementedError:
-                        pass
-                else:
-                    store['SavesSkipped'] += 1
-                    
-                    try:
-                        NOTIFY(SAVE_SKIP, CONFIG['Save']['Frequency'] * store['SavesSkipped'], q_recv.qsize())
-                    except NotImplementedError:
-                        pass
-                q_send.put({'SaveFinished': None})
-            
-            update_resolution = False
-            
-            #Check for new program loaded
-            if 'Program' in received_data:
-                current_program = received_data['Program']
-                
-                if current_program != store['LastProgram']:
-                    update_resolution = True
-                    
-                    if current_program is None:
-                        NOTIFY(APPLICATION_LOADING)
-                    else:
-                        NOTIFY(APPLICATION_LOADING, current_program)
-                    NOTIFY.send(q_send)
-                    
-                    #Save old profile
-                    _save_wrapper(q_send, store['LastProgram'], store['Data'], True)
-                    
-                    #Load new profile
-                    store['LastProgram'] = current_program
-                    store['Data'] = LoadData(current_program)
-                    store['ActivitySinceLastSave'] = False
-                    
-                    #Check new resolution
-                    try:
-                        store['ApplicationResolution'] = received_data['ApplicationResolution']
-                    except AttributeError:
-                        pass
-                    if store['ApplicationResolution'] is None:
-                        check_resolution(store['Data'], store['Resolution'])
-                    else:
-                        check_resolution(store['Data'], store['ApplicationResolution'][1])
-                        
-                    if store['Data']['Ticks']['Total']:
-                        NOTIFY(DATA_LOADED)
-                    else:
-                        NOTIFY(DATA_NOTFOUND)
-                    
-                    try:
-                        NOTIFY(QUEUE_SIZE, q_recv.qsize())
-                    except NotImplementedError:
-                        pass
-                        
-                NOTIFY.send(q_send)
-            
-            if 'ApplicationResolution' in received_data:
-                store['ApplicationResolution'] = received_data['ApplicationResolution']
-                if store['ApplicationResolution'] is not None:
-                    check_resolution(store['Data'], store['ApplicationResolution'][1])
-                    update_resolution = True
-
-            if 'Resolution' in received_data:
-                store['Resolution'] = received_data['Resolution']
-                check_resolution(store['Data'], received_data['Resolution'])
-                update_resolution = True
-            
-            if 'MonitorLimits' in received_data:
-                store['MonitorLimits'] = received_data['MonitorLimits']
-                update_resolution = True
-            
-            #Keep the history tracking the correct resolution
-            if update_resolution and CONFIG['Main']['HistoryLength']:
-                if store['ApplicationResolution'] is not None:
-                    history_resolution = store['ApplicationResolution']
-                elif MULTI_MONITOR:
-                    history_resolution = store['MonitorLimits']
-                else:
-                    history_resolution = store['Resolution']
-                try:
-                    if store['Data']['HistoryAnimation']['Tracks'][-1][0] != history_resolution:
-                        raise IndexError
-                except IndexError:
-                    store['Data']['HistoryAnimation']['Tracks'].append([history_resolution])
-            
-            #Record key presses
-            if 'KeyPress' in received_data:
-                store['ActivitySinceLastSave'] = True
-                
-                for key in received_data['KeyPress']:
-                
-                    _record_keypress(store['Data']['Keys'], 'Pressed', key)
-                    
-                    #Record mistakes
-                    #Only records the key if a single backspace is used
-                    if key == 'BACK':
-                        last = store['KeyTrack']['LastKey']
-                        if last is not None and last != 'BACK':
-                            store['KeyTrack']['Backspace'] = last
-                        else:
-                            store['KeyTrack']['Backspace'] = False
-                    elif store['KeyTrack']['Backspace']:
-                        _record_keypress(store['Data']['Keys'], 'Mistakes', store['KeyTrack']['Backspace'], key)
-                        store['KeyTrack']['Backspace'] = False
-                    
-                    #Record interval between key presses
-                    if store['KeyTrack']['Time'] is not None:
-                        time_difference = store['Data']['Ticks']['Total'] - store['KeyTrack']['Time']
-                        _record_keypress(store['Data']['Keys'], 'Intervals', 'Total', time_difference)
-                        _record_keypress(store['Data']['Keys'], 'Intervals', 'Individual', store['KeyTrack']['LastKey'], key, time_difference)
-                    
-                    store['KeyTrack']['LastKey'] = key
-                    store['KeyTrack']['Time'] = store['Data']['Ticks']['Total']
-            
-            #Record time keys are held down
-            if 'KeyHeld' in received_data:
-                store['ActivitySinceLastSave'] = True
-                
-                for key in received_data['KeyHeld']:
-                    _record_keypress(store['Data']['Keys'], 'Held', key)
-            
-            #Record button presses
+            profiler.start()
             try:
-                pressed_buttons = received_data['GamepadButtonPress']
-            except KeyError:
-                pass
-            else:
-                store['ActivitySinceLastSave'] = True
-                for button_id in pressed_buttons:
-                    try:
-                        store['Data']['Gamepad']['All']['Buttons']['Pressed'][button_id] += 1
-                    except KeyError:
-                        store['Data']['Gamepad']['All']['Buttons']['Pressed'][button_id] = 1
-                    try:
-                        store['Data']['Gamepad']['Session']['Buttons']['Pressed'][button_id] += 1
-                    except KeyError:
-                        store['Data']['Gamepad']['Session']['Buttons']['Pressed'][button_id] = 1
+                received_data = q_recv.get(timeout=poll_time)
+            except Empty:
+                received_data = {}
+            profiler.mark('Wait')
             
-            #Record how long buttons are held
-            try:
-               held_buttons = received_data['GamepadButtonHeld']
-            except KeyError:
-                pass
-            else:
-                store['ActivitySinceLastSave'] = True
-                for button_id in held_buttons:
-                    try:
-                        store['Data']['Gamepad']['All']['Buttons']['Held'][button_id] += 1
-                    except KeyError:
-                        store['Data']['Gamepad']['All']['Buttons']['Held'][button_id] = 1
-                    try:
-                        store['Data']['Gamepad']['Session']['Buttons']['Held'][button_id] += 1
-                    except KeyError:
-                        store['Data']['Gamepad']['Session']['Buttons']['Held'][button_id] = 1
-                        
-            #Axis updates
+            #Unpack multiple frames if they were grouped together
             try:
-                axis_updates = received_data['GamepadAxis']
+                frames = received_data['Batch']
             except KeyError:
-                pass
-            else:
-                for controller_axis in axis_updates:
-                    for axis, amount in get_items(controller_axis):
-                        try:
-                            store['Data']['Gamepad']['All']['Axis'][axis][amount] += 1
-                        except KeyError:
-                            try:
-                                store['Data']['Gamepad']['All']['Axis'][axis][amount] = 1
-                            except KeyError:
-                                store['Data']['Gamepad']['All']['Axis'][axis] = {amount: 1}
-                        try:
-                            store['Data']['Gamepad']['Session']['Axis'][axis][amount] += 1
-                        except KeyError:
-                            try:
-                                store['Data']['Gamepad']['Session']['Axis'][axis][amount] = 1
-                            except KeyError:
-                                store['Data']['Gamepad']['Session']['Axis'][axis] = {amount: 1}
-                                
+                frames = [received_data] if received_data else []
             
-            #Calculate and track mouse movement
-            if 'MouseMove' in received_data:
-                store['ActivitySinceLastSave'] = True
-                resolution = 0
-                _resolution = -1
-                
-                start, end = received_data['MouseMove']
-                #distance = find_distance(end, start)
-                
-                if CONFIG['Main']['HistoryLength']:
-                    store['Data']['HistoryAnimation']['Tracks'][-1].append(end)
-                
-                #Calculate the pixels in the line
-                if start is None:
-                    mouse_coordinates = [end]
-                else:
-                    mouse_coordinates = [start] + calculate_line(start, end) + [end]
-                    
-                #Make sure resolution exists in data
-                if store['ApplicationResolution'] is not None:
-                    check_resolution(store['Data'], store['ApplicationResolution'][1])
-                    
-                elif MULTI_MONITOR:
-                    try:
-                        #Don't bother calculating offset for each pixel
-                        #if both start and end are on the same monitor
-                        resolution, (x_offset, y_offset) = monitor_offset(start, store['MonitorLimits'])
-                        _resolution = monitor_offset(end, store['MonitorLimits'])[0]
-                    except TypeError:
-                        if not resolution:
-                            mouse_coordinates = [] 
-                    else:
-                        check_resolution(store['Data'], resolution)
-                        if resolution != _resolution:
-                            check_resolution(store['Data'], resolution)
-                        _resolutions = [resolution, _resolution]
-                        
-                #Write each pixel to the dictionary
-                for (x, y) in mouse_coordinates:
-                
-                    try:
-                        (x, y), resolution = get_monitor_coordinate(x, y, store)
-                    except TypeError:
-                        continue
-                        
-                    store['Data']['Resolution'][resolution]['Tracks'][y][x] = store['Data']['Ticks']['Tracks']
-                        
-                store['Data']['Ticks']['Tracks'] += 1
-                
-                #Compress tracks if the count gets too high
-                max_track_value = CONFIG['Advanced']['CompressTrackMax']
-                if not max_track_value:
-                    max_track_value = MAX_INT
-                
-                '''
-                if store['Data']['Ticks']['Tracks'] > max_track_value:
-                    compress_multplier = CONFIG['Advanced']['CompressTrackAmount']
-                    NOTIFY(TRACK_COMPRESS_START, 'track')
-                    NOTIFY.send(q_send)
-                    
-                    tracks = store['Data']['Maps']['Tracks']
-                    for resolution in tracks.keys():
-                        tracks[resolution] = numpy.divide(tracks[resolution], compress_multplier, as_int=True)
-                        #if not numpy.count(tracks[resolution]):
-                        #    del tracks[resolution]
-                            
-                    NOTIFY(TRACK_COMPRESS_END, 'track')
-                    try:
-                        NOTIFY(QUEUE_SIZE, q_recv.qsize())
-                    except NotImplementedError:
-                        pass
-                        
-                    store['Data']['Ticks']['Tracks'] //= compress_multplier
-                    store['Data']['Ticks']['Session']['Tracks'] //= compress_multplier
-                    store['Data']['Ticks']['Tracks'] = int(store['Data']['Ticks']['Tracks'])
-                    store['Data']['Ticks']['Session']['Tracks'] = int(store['Data']['Ticks']['Session']['Tracks'])
-                    '''
-                
-            #Record mouse clicks
-            if 'MouseClick' in received_data:
-                store['ActivitySinceLastSave'] = True
-                
-                for mouse_button_index, (x, y) in received_data['MouseClick']:
-                    
-                    try:
-                        (x, y), resolution = get_monitor_coordinate(x, y, store)
-                    except TypeError:
-                        continue
-                    
-                    mouse_button = ['Left', 'Middle', 'Right'][mouse_button_index]
-                    
-                    store['Data']['Resolution'][resolution]['Clicks']['All']['Single'][mouse_button][y][x] += 1
-                    store['Data']['Resolution'][resolution]['Clicks']['Session']['Single'][mouse_button][y][x] += 1
-                    
-            #Record double clicks
-            if 'DoubleClick' in received_data:
-                store['ActivitySinceLastSave'] = True
-                
-                for mouse_button_index, (x, y) in received_data['DoubleClick']:
-                                            
-                    try:
-                        (x, y), resolution = get_monitor_coordinate(x, y, store)
-                    except TypeError:
-                        continue
-                    
-                    mouse_button = ['Left', 'Middle', 'Right'][mouse_button_index]
-                    store['Data']['Resolution'][resolution]['Clicks']['All']['Double'][mouse_button][y][x] += 1
-                    store['Data']['Resolution'][resolution]['Clicks']['Session']['Double'][mouse_button][y][x] += 1
+            #Read the ring buffer up to where the message was sent
+            if ring is not None:
+                ring_position = received_data.pop('RingPosition', None)
+                frames = decode_frames(ring.read(ring_position)) + frames
+                profiler.mark('RingBuffer')
             
+            exit_process = False
+            for frame_data in frames:
+                if _process_frame(store, frame_data, q_recv, q_send):
+                    exit_process = True
+                    break
+                NOTIFY.send(q_send)
+                profiler.mark('Notify')
+            _record_pending_moves(store)
+            _refresh_tracks(store)
+            profiler.mark('RefreshTracks')
             
-            #Trim the history list if too long
-            if 'HistoryCheck' in received_data and CONFIG['Main']['HistoryLength']:
-                history = store['Data']['HistoryAnimation']['Tracks']
-                history_len = [len(i) - 1 for i in history]
-                max_length = CONFIG['Main']['HistoryLength'] * UPDATES_PER_SECOND
-                
-                if sum(history_len) > max_length:
-                    count = 0
-                    for i, value in enumerate(history):
-                        count += history_len[i]
-                        if count >= max_length:
-                            history = history[i:]
-                            if count > max_length:
-                                offset = history_len[i] - max_length
-                                try:
-                                    history[i] = [value[0]] + value[offset+1:]
-                                #Temporary error check
-                                except IndexError:
-                                    raise IndexError(value[:5])
-                            break
-                    store['Data']['HistoryAnimation']['Tracks'] = history
-
-            store['Data']['Ticks']['Recorded'] += 1
+            _report_saves(store, q_send)
             
-            if 'Quit' in received_data or 'Exit' in received_data:
+            if exit_process:
                 break
-
-            NOTIFY.send(q_send)
         
         #Exit process (this shouldn't happen for now)
+        profiler.dump()
         NOTIFY(THREAD_EXIT)
         NOTIFY.send(q_send)
+        store['Writer'].close()
+        _report_saves(store, q_send)
         _save_wrapper(q_send, store['LastProgram'], store['Data'], False)
             
     except Exception as e:
@@ -609,3 +734,7 @@ def background_process(q_recv, q_send):
         
     except KeyboardInterrupt:
         pass
+    
+    finally:
+        if ring is not None:
+            ring.close()
@@ -0,0 +1,79 @@
+"""
+This is part of the Mouse Tracks Python application.
+Source: https://github.com/Peter92/MouseTracks
+"""
+#Find which monitor coordinates are on without checking each monitor in turn
+
+from __future__ import absolute_import
+
+from bisect import bisect_right
+
+import core.numpy as numpy
+from core.compatibility import range
+
+
+class MonitorIndex(object):
+    """Lookup table of which monitor covers each part of the screen.
+
+    The edges of every monitor split the screen into a grid,
+    and each cell of the grid is either on a single monitor or not on any.
+    Finding a coordinate is then a binary search on each axis.
+    If monitors overlap, the first one in the list is used.
+    """
+    def __init__(self, monitor_limits):
+        self.monitors = [tuple(monitor) for monitor in monitor_limits]
+        self.x_edges = sorted(set(x for x1, y1, x2, y2 in self.monitors for x in (x1, x2)))
+        self.y_edges = sorted(set(y for x1, y1, x2, y2 in self.monitors for y in (y1, y2)))
+
+        table = []
+        for i in range(len(self.y_edges) - 1):
+            row = []
+            for j in range(len(self.x_edges) - 1):
+                row.append(self._find_monitor(self.x_edges[j], self.y_edges[i]))
+            table.append(row)
+        self._table = table
+        self._array = numpy.array(table, dtype='int32').reshape(len(table), max(len(self.x_edges) - 1, 0))
+
+    def _find_monitor(self, x, y):
+        for i, (x1, y1, x2, y2) in enumerate(self.monitors):
+            if x1 <= x < x2 and y1 <= y < y2:
+                return i
+        return -1
+
+    def find(self, x, y):
+        """Get the index of the monitor for a single coordinate, or None."""
+        i = bisect_right(self.y_edges, y) - 1
+        j = bisect_right(self.x_edges, x) - 1
+        if not (0 <= i < len(self._table) and 0 <= j < len(self._table[i])):
+            return None
+        monitor = self._table[i][j]
+        if monitor < 0:
+            return None
+        return monitor
+
+    def classify(self, x, y):
+        """Get the index of the monitor for arrays of coordinates.
+        Anything that isn't on a monitor is set to -1.
+        """
+        i = numpy.bin_index(self.y_edges, y)
+        j = numpy.bin_index(self.x_edges, x)
+        if not self.monitors:
+            return i
+        monitors = self._array[i, j]
+        monitors[(i < 0) | (j < 0)] = -1
+        return monitors
+
+    def split(self, x, y):
+        """Group arrays of coordinates by monitor.
+        Any coordinates that don't land on a monitor are dropped.
+
+        Yields:
+            Monitor limits, the boolean mask used on the input, and the coordinates relative to the monitor.
+        """
+        monitors = self.classify(x, y)
+        for monitor in numpy.sort(monitors, unique=True):
+            if monitor < 0:
+                continue
+            selection = monitors == monitor
+            x1, y1, x2, y2 = self.monitors[monitor]
+            yield (x1, y1, x2, y2), selection, (x[selection] - x1, y[selection] - y1)
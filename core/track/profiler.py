@@ -0,0 +1,108 @@
+"""
+This is part of the Mouse Tracks Python application.
+Source: https://github.com/Peter92/MouseTracks
+"""
+#Time how long each stage of the tracking takes
+
+from __future__ import absolute_import, division
+
+import json
+import time
+
+from core.base import format_file_path
+from core.compatibility import get_items, monotonic
+from core.config import CONFIG
+from core.constants import DEFAULT_PATH
+from core.os import create_folder
+
+
+PROFILE_PATH = format_file_path('{}\\profile.jsonl'.format(DEFAULT_PATH))
+
+
+class StageProfiler(object):
+    """Time each stage of a loop, and store the results as histograms.
+
+    Call start at the beginning of the loop, and mark at the end of each stage.
+    Times are in microseconds, and bin n of the histogram counts any time
+    that needs n bits, so each bin is twice the size of the previous one.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.reset()
+        self.start()
+
+    def reset(self):
+        self.stages = {}
+        self.started = time.time()
+
+    def start(self):
+        self._last = monotonic()
+
+    def mark(self, stage):
+        """Record the time since the last mark."""
+        now = monotonic()
+        elapsed = int((now - self._last) * 1000000)
+        self._last = now
+
+        try:
+            data = self.stages[stage]
+        except KeyError:
+            data = self.stages[stage] = {'Count': 0, 'Total': 0, 'Max': 0, 'Bins': []}
+        data['Count'] += 1
+        data['Total'] += elapsed
+        data['Max'] = max(data['Max'], elapsed)
+
+        bins = data['Bins']
+        i = elapsed.bit_length()
+        if i >= len(bins):
+            bins.extend([0] * (i + 1 - len(bins)))
+        bins[i] += 1
+
+    def summary(self):
+        """Get the results since the last reset."""
+        stages = {}
+        for stage, data in get_items(self.stages):
+            stages[stage] = {'count': data['Count'],
+                             'total_us': data['Total'],
+                             'max_us': data['Max'],
+                             'mean_us': data['Total'] / data['Count'],
+                             'histogram': list(data['Bins'])}
+        return {'name': self.name,
+                'start': self.started,
+                'end': time.time(),
+                'stages': stages}
+
+    def dump(self, file_name=PROFILE_PATH, reset=True):
+        """Append the results to a file as a single line of JSON."""
+        write_summary(self.summary(), file_name)
+        if reset:
+            self.reset()
+
+
+class NullProfiler(object):
+    """Used in place of StageProfiler when profiling is disabled."""
+    def reset(self):
+        pass
+
+    def start(self):
+        pass
+
+    def mark(self, stage):
+        pass
+
+    def dump(self, *args, **kwargs):
+        pass
+
+
+def write_summary(summary, file_name=PROFILE_PATH):
+    """Append any results to the profiling file as a single line of JSON."""
+    create_folder(file_name)
+    with open(file_name, 'a') as f:
+        f.write(json.dumps(summary, sort_keys=True) + '\n')
+
+
+def create_profiler(name):
+    """Create a profiler if it is enabled in the config."""
+    if CONFIG['Advanced']['ProfileStages']:
+        return StageProfiler(name)
+    return NullProfiler()
@@ -0,0 +1,144 @@
+"""
+This is part of the Mouse Tracks Python application.
+Source: https://github.com/Peter92/MouseTracks
+"""
+#Keep recently used profiles loaded, and save them in the background
+
+from __future__ import absolute_import
+
+import traceback
+from collections import OrderedDict
+from threading import Lock, Thread
+
+from core.compatibility import Queue, Empty
+from core.files import snapshot_data
+
+
+class ProfileWriter(object):
+    """Save profiles in a separate thread, so that input can still be processed.
+
+    A snapshot is taken of the data when it is queued, so the original can
+    still be written to. Until the save is finished, pending() returns
+    the original data, so it doesn't get loaded again from an old file.
+    
+    The compressed arrays from the last save of up to max_profiles profiles
+    are kept, so anything that hasn't changed doesn't need compressing again.
+    """
+    def __init__(self, save, max_profiles=1):
+        self.max_profiles = max_profiles
+        self._save = save
+        self._members = OrderedDict()
+        self._pending = {}
+        self._lock = Lock()
+        self._queue = Queue()
+        self._results = Queue()
+        self._thread = Thread(target=self._write_queued)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _write_queued(self):
+        """Save each snapshot in the queue, until None is received."""
+        while True:
+            entry = self._queue.get()
+            if entry is None:
+                return
+            program, snapshot, tag = entry
+            members = self._members.pop(program, {})
+            self._members[program] = members
+            while len(self._members) > self.max_profiles:
+                self._members.popitem(last=False)
+            try:
+                self._results.put((program, tag, self._save(program, snapshot, tag, members), None))
+            except Exception:
+                self._results.put((program, tag, False, traceback.format_exc()))
+            finally:
+                with self._lock:
+                    pending = self._pending[program]
+                    pending[1] -= 1
+                    if not pending[1]:
+                        del self._pending[program]
+
+    def write(self, program, data, tag=None):
+        """Queue a profile to be saved.
+        The save function is given the program, a snapshot of the data, the tag,
+        and a dict of compressed arrays to pass to prepare_file.
+        The tag is also returned with the result.
+        """
+        snapshot = snapshot_data(data)
+        with self._lock:
+            try:
+                count = self._pending[program][1]
+            except KeyError:
+                count = 0
+            self._pending[program] = [data, count + 1]
+        self._queue.put((program, snapshot, tag))
+
+    def pending(self, program):
+        """Get the data of a profile that is still being saved, or None."""
+        with self._lock:
+            try:
+                return self._pending[program][0]
+            except KeyError:
+                return None
+
+    def finished(self):
+        """Get the result of each save since the last call, as (program, tag, saved, error)."""
+        while True:
+            try:
+                yield self._results.get_nowait()
+            except Empty:
+                return
+
+    def close(self):
+        """Wait for any queued saves to finish."""
+        self._queue.put(None)
+        self._thread.join()
+
+
+class ProfileCache(object):
+    """Store the most recently used profiles, so switching back to one doesn't need to load it again.
+
+    When a profile is added, it is saved in the background if anything changed.
+    The oldest profiles are removed when there are more than max_profiles,
+    or when they use more than max_memory bytes between them.
+    """
+    def __init__(self, writer, max_profiles, max_memory):
+        self.max_profiles = max_profiles
+        self.max_memory = max_memory
+        self._writer = writer
+        self._profiles = OrderedDict()
+
+    def __len__(self):
+        return len(self._profiles)
+
+    def __contains__(self, program):
+        return program in self._profiles
+
+    def add(self, program, data, changed=True):
+        """Add a profile that is no longer being used.
+        If it has changed, it will be saved in the background.
+        """
+        if changed:
+            self._writer.write(program, data, 'Switch')
+        self._profiles.pop(program, None)
+        self._profiles[program] = data
+        self._trim()
+
+    def get(self, program):
+        """Remove a profile from the cache and return it, or None if it isn't stored.
+        Profiles that have been removed from the cache are still returned if they're being saved.
+        """
+        try:
+            return self._profiles.pop(program)
+        except KeyError:
+            return self._writer.pending(program)
+
+    def _trim(self):
+        """Remove the oldest profiles until both limits are met."""
+        sizes = OrderedDict((program, data.memory_usage()) for program, data in self._profiles.items())
+        memory = sum(sizes.values())
+        for program, size in sizes.items():
+            if len(self._profiles) <= self.max_profiles and memory <= self.max_memory:
+                break
+            del self._profiles[program]
+            memory -= size
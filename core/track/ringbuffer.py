@@ -0,0 +1,220 @@
+"""
+This is part of the Mouse Tracks Python application.
+Source: https://github.com/Peter92/MouseTracks
+"""
+#Send the most common input events between processes without pickling them
+
+from __future__ import absolute_import
+
+import struct
+
+from core.compatibility import get_items
+from core.maths import round_int
+from core.os import KEYS, KEY_NAMES
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+
+SHARED_MEMORY = shared_memory is not None
+
+RING_CAPACITY = 65536
+
+EVENT_TICKS = 1
+
+EVENT_MOUSE_START = 2
+
+EVENT_MOUSE_MOVE = 3
+
+EVENT_MOUSE_CLICK = 4
+
+EVENT_DOUBLE_CLICK = 5
+
+EVENT_KEY_PRESS = 6
+
+EVENT_KEY_HELD = 7
+
+#Each record is (tick, type, button/key id, x, y)
+_RECORD = struct.Struct('<IBxHii')
+
+_POSITION = struct.Struct('<Q')
+
+#Keep the read and write positions on separate cache lines
+_HEAD_OFFSET = 0
+
+_TAIL_OFFSET = 64
+
+_DATA_OFFSET = 128
+
+
+class EventRingBuffer(object):
+    """Fixed size ring buffer of event records in shared memory.
+
+    It is lock free, so only one process may write to it,
+    and only one process may read from it.
+    The head and tail are only ever increased, and each side only writes its own one.
+    """
+    def __init__(self, name=None, capacity=RING_CAPACITY):
+        if shared_memory is None:
+            raise ImportError('shared memory requires Python 3.8 or higher')
+
+        self.capacity = capacity
+        size = _DATA_OFFSET + capacity * _RECORD.size
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=size)
+            self.memory.buf[:_DATA_OFFSET] = b'\x00' * _DATA_OFFSET
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.name = self.memory.name
+        self._head = self.head
+        self._tail = self.tail
+
+    @property
+    def head(self):
+        """Get the position of the next record to be written."""
+        return _POSITION.unpack_from(self.memory.buf, _HEAD_OFFSET)[0]
+
+    @property
+    def tail(self):
+        """Get the position of the next record to be read."""
+        return _POSITION.unpack_from(self.memory.buf, _TAIL_OFFSET)[0]
+
+    def write(self, records):
+        """Write a list of records and publish them all at once.
+        Returns False if there is not enough space.
+        """
+        if not records:
+            return True
+        if self._head + len(records) - self.tail > self.capacity:
+            return False
+
+        buf = self.memory.buf
+        head = self._head
+        for record in records:
+            _RECORD.pack_into(buf, _DATA_OFFSET + (head % self.capacity) * _RECORD.size, *record)
+            head += 1
+
+        #Only move the head once everything has been written
+        _POSITION.pack_into(buf, _HEAD_OFFSET, head)
+        self._head = head
+        return True
+
+    def read(self, end=None):
+        """Read records until the end position, or until the buffer is empty."""
+        head = self.head
+        if end is None or end > head:
+            end = head
+
+        buf = self.memory.buf
+        records = []
+        tail = self._tail
+        while tail < end:
+            records.append(_RECORD.unpack_from(buf, _DATA_OFFSET + (tail % self.capacity) * _RECORD.size))
+            tail += 1
+
+        #Free the space once the records have been copied
+        if tail != self._tail:
+            _POSITION.pack_into(buf, _TAIL_OFFSET, tail)
+            self._tail = tail
+        return records
+
+    def close(self, unlink=False):
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+
+
+def encode_frame(tick, frame_data):
+    """Convert the input events of a frame to records.
+
+    Returns:
+        List of records, and a dict of anything that must still be sent through the queue.
+    """
+    records = []
+    remaining = {}
+    tick &= 0xFFFFFFFF
+
+    for key, value in get_items(frame_data):
+        if key == 'Ticks':
+            records.append((tick, EVENT_TICKS, 0, value, 0))
+
+        elif key == 'MouseMove':
+            start, end = value
+            if start is not None:
+                records.append((tick, EVENT_MOUSE_START, 0, round_int(start[0]), round_int(start[1])))
+            records.append((tick, EVENT_MOUSE_MOVE, 0, round_int(end[0]), round_int(end[1])))
+
+        elif key == 'MouseClick':
+            for mouse_button, (x, y) in value:
+                records.append((tick, EVENT_MOUSE_CLICK, mouse_button, round_int(x), round_int(y)))
+
+        elif key == 'DoubleClick':
+            for mouse_button, (x, y) in value:
+                records.append((tick, EVENT_DOUBLE_CLICK, mouse_button, round_int(x), round_int(y)))
+
+        elif key == 'KeyPress':
+            records += [(tick, EVENT_KEY_PRESS, KEYS[k], 0, 0) for k in value]
+
+        elif key == 'KeyHeld':
+            records += [(tick, EVENT_KEY_HELD, KEYS[k], 0, 0) for k in value]
+
+        #Only used by the main process
+        elif key == 'MouseHeld':
+            pass
+
+        else:
+            remaining[key] = value
+
+    return records, remaining
+
+
+def decode_frames(records):
+    """Rebuild the frames from a list of records.
+    Consecutive records with the same tick are grouped into one frame.
+    """
+    frames = []
+    last_tick = None
+    start = None
+    for tick, event, id, x, y in records:
+        if tick != last_tick:
+            frame_data = {}
+            frames.append(frame_data)
+            last_tick = tick
+
+        if event == EVENT_TICKS:
+            frame_data['Ticks'] = x
+
+        elif event == EVENT_MOUSE_START:
+            start = (x, y)
+
+        elif event == EVENT_MOUSE_MOVE:
+            frame_data['MouseMove'] = (start, (x, y))
+            start = None
+
+        elif event == EVENT_MOUSE_CLICK:
+            try:
+                frame_data['MouseClick'].append((id, (x, y)))
+            except KeyError:
+                frame_data['MouseClick'] = [(id, (x, y))]
+
+        elif event == EVENT_DOUBLE_CLICK:
+            try:
+                frame_data['DoubleClick'].append((id, (x, y)))
+            except KeyError:
+                frame_data['DoubleClick'] = [(id, (x, y))]
+
+        elif event == EVENT_KEY_PRESS:
+            try:
+                frame_data['KeyPress'].append(KEY_NAMES[id])
+            except KeyError:
+                frame_data['KeyPress'] = [KEY_NAMES[id]]
+
+        elif event == EVENT_KEY_HELD:
+            try:
+                frame_data['KeyHeld'].append(KEY_NAMES[id])
+            except KeyError:
+                frame_data['KeyHeld'] = [KEY_NAMES[id]]
+
+    return frames
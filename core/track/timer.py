@@ -0,0 +1,71 @@
+"""
+This is part of the Mouse Tracks Python application.
+Source: https://github.com/Peter92/MouseTracks
+"""
+#Keep track of periodic tasks without checking every one of them each tick
+
+from __future__ import absolute_import
+
+import heapq
+import random
+
+
+class Timers(object):
+    """Run tasks every so many ticks.
+
+    The tasks are kept in a heap ordered by when they are next due,
+    so checking them only costs anything when something needs to run.
+    If multiple periods pass at once (such as when frames are dropped),
+    the task only runs once.
+    """
+    def __init__(self):
+        self._queue = []
+        self._tasks = {}
+
+    def add(self, name, period, callback=None, offset=None):
+        """Add a new task.
+
+        If no offset is given, a random one is picked within the period,
+        so that tasks with the same period don't all run on the same tick.
+        Tasks with a period of 0 are disabled.
+        """
+        if not period:
+            return
+        if offset is None:
+            offset = random.randrange(period)
+        self._tasks[name] = [offset, period, callback]
+        heapq.heappush(self._queue, (offset, name))
+
+    def reset(self, name, ticks):
+        """Restart the period of a task from the current tick."""
+        try:
+            task = self._tasks[name]
+        except KeyError:
+            return
+        task[0] = ticks + task[1]
+        heapq.heappush(self._queue, (task[0], name))
+
+    def due(self, ticks):
+        """Run the callback of any task that is due.
+
+        Returns:
+            List of the names of every task that was due.
+        """
+        due = []
+        while self._queue and self._queue[0][0] <= ticks:
+            next_tick, name = heapq.heappop(self._queue)
+            task = self._tasks[name]
+
+            #Ignore anything left over from a reset
+            if task[0] != next_tick:
+                continue
+
+            task[0] = next_tick + task[1] * ((ticks - next_tick) // task[1] + 1)
+            heapq.heappush(self._queue, (task[0], name))
+            due.append(name)
+
+        for name in due:
+            callback = self._tasks[name][2]
+            if callback is not None:
+                callback()
+        return due
@@ -4,7 +4,7 @@ Source: https://github.com/Peter92/MouseTracks
 """
 #Wrapper for the xinput library, to allow it to be used without events
 
-from __future__ import absolute_import, division
+from __future__ import absolute_import, division, print_function
 from itertools import count
 from operator import itemgetter
 import ctypes
@@ -86,8 +86,8 @@ if __name__ == '__main__':
     while True:
         for gamepad in gamepads:
             with gamepad as gamepad_input:
-                for axis, amount in gamepad_input.get_button().iteritems():
-                    print axis, amount
-                for button, state in gamepad_input.get_axis().iteritems():
-                    print button, state
+                for axis, amount in gamepad_input.get_button().items():
+                    print(axis, amount)
+                for button, state in gamepad_input.get_axis().items():
+                    print(button, state)
         time.sleep(1/60)
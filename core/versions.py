@@ -9,6 +9,8 @@ import time
 
 import core.numpy as numpy
 from core.compatibility import get_items, unicode
+from core.history import HistoryBuffer
+from core.stats import AxisStats, KeyStats
 
 
 VERSION_HISTORY = [
@@ -37,7 +39,15 @@ VERSION_HISTORY = [
     '2.0.10d',
     '2.0.11',
     '2.0.12',
-    '2.0.13'
+    '2.0.13',
+    '2.0.14',
+    '2.0.15',
+    '2.0.16',
+    '2.0.17',
+    '2.0.18',
+    '2.0.19',
+    '2.0.20',
+    '2.0.21'
 ]
 
 VERSION = VERSION_HISTORY[-1]
@@ -47,22 +57,23 @@ class IterateMaps(object):
     def __init__(self, maps):
         self.maps = maps
         
-    def _iterate(self, maps, command, extra=None, _legacy=False):            
+    def _iterate(self, maps, command, extra=None, _legacy=False, _path=()):            
         for key, value in get_items(maps):
             
             #Old format where resolution was separate for each map
             if _legacy and isinstance(key, (str, unicode)):
-                self._iterate(value, command, extra, _legacy=_legacy)
+                self._iterate(value, command, extra, _legacy=_legacy, _path=_path + (key,))
             
             #New format when each resolution contains all the maps
             elif not _legacy and isinstance(value, dict):
-                self._iterate(value, command, extra, _legacy=_legacy)
+                self._iterate(value, command, extra, _legacy=_legacy, _path=_path + (key,))
 
             #Separate the numpy arrays from the data
             elif command == 'separate':
                 array = maps[key]
                 maps[key] = len(self._map_list)
                 self._map_list.append(array)
+                self.paths.append(_path + (key,))
             
             #Rejoin the numpy arrays with the data
             elif command == 'join':
@@ -77,8 +88,11 @@ class IterateMaps(object):
                 maps[key] = numpy_array
                 
     def separate(self):
-        """Separate the numpy maps from the main data, and replace with an integer."""
+        """Separate the numpy maps from the main data, and replace with an integer.
+        The keys leading to each map are stored in paths.
+        """
         self._map_list = []
+        self.paths = []
         self._iterate(self.maps, 'separate')
         return self._map_list
 
@@ -131,6 +145,14 @@ def upgrade_version(data={}, update_metadata=True):
     2.0.11: Gamepad tracking
     2.0.12: Change resolutions to major keys
     2.0.13: Record history of tracks for animation
+    2.0.14: Split track maps into tiles to save memory
+    2.0.15: Only store the clicked pixels in the click maps
+    2.0.16: Only create click maps once they are written to
+    2.0.17: Calculate session clicks from the total instead of storing them separately
+    2.0.18: Store key statistics in arrays indexed by key
+    2.0.19: Group key press intervals into log spaced bins
+    2.0.20: Store gamepad axis values in fixed size histograms
+    2.0.21: Store the track history in a ring buffer
     """
 
     #Make sure version is in history, otherwise set to lowest version
@@ -356,53 +378,69 @@ def upgrade_version(data={}, update_metadata=True):
     if current_version_id < _get_id('2.0.13'):
         data['HistoryAnimation'] = {'Tracks': [], 'Clicks': [], 'Keyboard': []}
     
+    if current_version_id < _get_id('2.0.14'):
+        for resolution, values in get_items(data['Resolution']):
+            values['Tracks'] = numpy.TiledArray.from_array(values['Tracks'])
+    
+    if current_version_id < _get_id('2.0.15'):
+        for resolution, values in get_items(data['Resolution']):
+            for clicks in values['Clicks'].values():
+                for buttons in clicks.values():
+                    for button, array in get_items(buttons):
+                        buttons[button] = numpy.SparseArray.from_array(array)
+    
+    if current_version_id < _get_id('2.0.16'):
+        for resolution, values in get_items(data['Resolution']):
+            for clicks in values['Clicks'].values():
+                for click_type, buttons in get_items(clicks):
+                    used = [(button, array) for button, array in get_items(buttons) if numpy.count(array)]
+                    clicks[click_type] = numpy.LazyArrays(resolution, used)
+    
+    if current_version_id < _get_id('2.0.17'):
+        for resolution, values in get_items(data['Resolution']):
+            session = values['Clicks'].pop('Session', {})
+            for click_type, buttons in get_items(values['Clicks']['All']):
+                for button, array in get_items(buttons):
+                    session_array = session.get(click_type, {}).get(button)
+                    if session_array is not None:
+                        array.baseline = {key: array.data.get(key, 0) - value
+                                          for key, value in get_items(session_array.data)}
+    
+    if current_version_id < _get_id('2.0.18'):
+        data['Keys'] = KeyStats.from_dicts(data['Keys'])
+    
+    if current_version_id < _get_id('2.0.19'):
+        keys = vars(data['Keys'])
+        if 'intervals' in keys:
+            all_intervals = keys.pop('intervals')
+            session_intervals = keys.pop('session_intervals')
+            data['Keys'].clear_intervals()
+            data['Keys'].load_intervals(all_intervals, session_intervals)
+    
+    if current_version_id < _get_id('2.0.20'):
+        axis_all = data['Gamepad']['All'].pop('Axis')
+        axis_session = data['Gamepad'].get('Session', {}).pop('Axis', None)
+        data['Gamepad']['Axis'] = AxisStats.from_dicts(axis_all, axis_session)
+    
+    if current_version_id < _get_id('2.0.21'):
+        data['HistoryAnimation']['Tracks'] = HistoryBuffer.from_segments(data['HistoryAnimation']['Tracks'])
+    
     if update_metadata:     
     
         #Only count as new session if updated or last save was over an hour ago
         if (data.get('Version', '-1') != VERSION or not data['SessionStarts'] or current_time - 3600 > data['Time']['Modified']):
             data['Ticks']['Session']['Tracks'] = data['Ticks']['Tracks']
             data['Ticks']['Session']['Total'] = data['Ticks']['Total']
-            data['Keys']['Session']['Pressed'] = {}
-            data['Keys']['Session']['Held'] = {}
-            data['Keys']['Session']['Intervals'] = {'Total': {}, 'Individual': {}}
-            data['Keys']['Session']['Mistakes'] = {}
+            data['Keys'].start_session()
             
-            #Empty session arrays
+            #Start the session clicks from the current values
             for resolution, values in get_items(data['Resolution']):
-                if 'Session' not in values['Clicks']:
-                    values['Clicks']['Session'] = {'Single': {'Left': numpy.array(resolution, create=True),
-                                                              'Middle': numpy.array(resolution, create=True),
-                                                              'Right': numpy.array(resolution, create=True)},
-                                                   'Double': {'Left': numpy.array(resolution, create=True),
-                                                              'Middle': numpy.array(resolution, create=True),
-                                                              'Right': numpy.array(resolution, create=True)}}
-                else:
-                    try:
-                        values['Clicks']['Session']['Single']['Left'] = numpy.fill(values['Clicks']['Session']['Single']['Left'], 0)
-                    except AttributeError:
-                        values['Clicks']['Session']['Single']['Left'] = numpy.array(resolution, create=True)
-                    try:
-                        values['Clicks']['Session']['Single']['Middle'] = numpy.fill(values['Clicks']['Session']['Single']['Middle'], 0)
-                    except AttributeError:
-                        values['Clicks']['Session']['Single']['Middle'] = numpy.array(resolution, create=True)
-                    try:
-                        values['Clicks']['Session']['Single']['Right'] = numpy.fill(values['Clicks']['Session']['Single']['Right'], 0)
-                    except AttributeError:
-                        values['Clicks']['Session']['Single']['Right'] = numpy.array(resolution, create=True)
-                    try:
-                        values['Clicks']['Session']['Double']['Left'] = numpy.fill(values['Clicks']['Session']['Double']['Left'], 0)
-                    except AttributeError:
-                        values['Clicks']['Session']['Double']['Left'] = numpy.array(resolution, create=True)
-                    try:
-                        values['Clicks']['Session']['Double']['Middle'] = numpy.fill(values['Clicks']['Session']['Double']['Middle'], 0)
-                    except AttributeError:
-                        values['Clicks']['Session']['Double']['Middle'] = numpy.array(resolution, create=True)
-                    try:
-                        values['Clicks']['Session']['Double']['Right'] = numpy.fill(values['Clicks']['Session']['Double']['Right'], 0)
-                    except AttributeError:
-                        values['Clicks']['Session']['Double']['Right'] = numpy.array(resolution, create=True)
+                for buttons in values['Clicks']['All'].values():
+                    for array in buttons.values():
+                        array.start_session()
                         
-            data['Gamepad']['Session'] = {'Buttons': {'Pressed': {}, 'Held': {}}, 'Axis': {}}
+            data['Gamepad']['Session'] = {'Buttons': {'Pressed': {}, 'Held': {}}}
+            data['Gamepad']['Axis'].start_session()
             data['TimesLoaded'] += 1
             data['SessionStarts'].append(current_time)
             
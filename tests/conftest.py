@@ -0,0 +1,17 @@
+"""
+This is part of the Mouse Tracks Python application.
+Source: https://github.com/Peter92/MouseTracks
+"""
+#Make the core package importable when running the checks from the repository root
+
+from __future__ import absolute_import
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+#The language is read from the locale, so make sure it's one that has a language file
+os.environ.setdefault('LC_ALL', 'en_GB.UTF-8')
@@ -0,0 +1,70 @@
+"""
+This is part of the Mouse Tracks Python application.
+Source: https://github.com/Peter92/MouseTracks
+"""
+#Check the batch line function draws the same pixels as the original one
+
+from __future__ import absolute_import
+
+import random
+import timeit
+
+import core.numpy as numpy
+from core.maths import calculate_line
+
+
+def _expected(start, end):
+    if start == end:
+        return [start]
+    return [start] + calculate_line(start, end) + [end]
+
+
+def _has_corner(start, end):
+    """If the line passes exactly through a pixel corner before the end.
+    calculate_line may take the step there one column later due to float error.
+    """
+    width, height = abs(end[0] - start[0]), abs(end[1] - start[1])
+    return bool(width and height % width and any(not i * height % width for i in range(1, width)))
+
+
+def test_calculate_lines_matches_calculate_line():
+    rng = random.Random(0)
+    lines = []
+    for i in range(5000):
+        size = rng.choice((1, 2, 3, 10, 50, 400))
+        lines.append(((rng.randint(-size, size), rng.randint(-size, size)),
+                      (rng.randint(-size, size), rng.randint(-size, size))))
+    x, y, index = numpy.calculate_lines([start for start, end in lines], [end for start, end in lines], index=True)
+    
+    result = [[] for line in lines]
+    for pixel_x, pixel_y, i in zip(x.tolist(), y.tolist(), index.tolist()):
+        result[i].append((pixel_x, pixel_y))
+    for (start, end), pixels in zip(lines, result):
+        expected = _expected(start, end)
+        if not _has_corner(start, end):
+            assert pixels == expected, (start, end)
+        
+        #Otherwise a pixel may only move by one step
+        assert len(pixels) == len(expected), (start, end)
+        assert pixels[0] == expected[0] and pixels[-1] == expected[-1], (start, end)
+        for pixel, expected_pixel in zip(pixels, expected):
+            assert max(abs(pixel[0] - expected_pixel[0]), abs(pixel[1] - expected_pixel[1])) <= 1, (start, end)
+        for pixel, next_pixel in zip(pixels, pixels[1:]):
+            assert max(abs(pixel[0] - next_pixel[0]), abs(pixel[1] - next_pixel[1])) == 1, (start, end)
+
+
+def test_calculate_lines_staircase():
+    x, y = numpy.calculate_lines([(5, 5)], [(0, 0)])
+    assert list(zip(x.tolist(), y.tolist())) == _expected((5, 5), (0, 0))
+    assert len(x) == 10
+
+
+def test_calculate_lines_long_line_speed():
+    start, end = (10, 500), (3809, 621)
+    x, y = numpy.calculate_lines([start], [end])
+    assert list(zip(x.tolist(), y.tolist())) == _expected(start, end)
+    
+    #A fast flick across the screen should be quicker than drawing it a pixel at a time
+    batch = min(timeit.repeat(lambda: numpy.calculate_lines([start], [end]), number=10, repeat=5))
+    single = min(timeit.repeat(lambda: calculate_line(start, end), number=10, repeat=5))
+    assert batch < single
@@ -0,0 +1,65 @@
+"""
+This is part of the Mouse Tracks Python application.
+Source: https://github.com/Peter92/MouseTracks
+"""
+#Replay a trace through the whole tracking process and check everything was saved
+
+from __future__ import absolute_import
+
+import os
+import platform
+import subprocess
+import sys
+
+import pytest
+
+from core.constants import DEFAULT_NAME
+from core.files import CustomOpen, decode_file, get_data_filename
+from core.os.replay import TraceRecorder
+
+from conftest import ROOT
+
+
+def _replay(tmp_path, frames):
+    """Record a trace, and run the tracking with it until it finishes."""
+    trace = str(tmp_path / 'trace.mtt')
+    recorder = TraceRecorder(trace, 60)
+    recorder.write_monitors([(0, 0, 1920, 1080)])
+    for frame in frames:
+        recorder.write_frame(frame)
+    recorder.close()
+    
+    #Use a separate home folder so nothing is saved over the real data
+    home = tmp_path / 'home'
+    (home / 'Mouse Tracks').mkdir(parents=True)
+    (home / 'Mouse Tracks' / 'config.ini').write_text(u'[Internet]\nEnable = False\n')
+    env = dict(os.environ, HOME=str(home), MOUSETRACKS_REPLAY=trace, MOUSETRACKS_REPLAY_SPEED='0')
+    subprocess.check_call([sys.executable, 'start_tracking.py'], cwd=ROOT, env=env, timeout=300,
+                          stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    
+    with CustomOpen(str(home / 'Mouse Tracks' / 'Data' / get_data_filename(DEFAULT_NAME)), 'rb') as f:
+        return decode_file(f)
+
+
+_LINUX_ONLY = pytest.mark.skipif(platform.system() != 'Linux', reason='the documents folder is only read from HOME on Linux')
+
+
+@_LINUX_ONLY
+def test_replay_saves_every_tick(tmp_path):
+    frames = [(i % 1900, i * 7 % 1000) for i in range(3000)]
+    
+    #Finish with the mouse not moving, so the last frames have nothing to send
+    frames += [frames[-1]] * 250
+    data = _replay(tmp_path, frames)
+    assert data['Ticks']['Total'] == len(frames)
+
+
+@_LINUX_ONLY
+def test_replay_starting_without_cursor(tmp_path):
+    """Tasks due on the first tick still run if the first frame is skipped."""
+    frames = [None] + [(i, i) for i in range(100)]
+    data = _replay(tmp_path, frames)
+    
+    #Skipped frames don't count as ticks
+    assert data['Ticks']['Total'] == len(frames) - 1
+    assert (1920, 1080) in data['Resolution']